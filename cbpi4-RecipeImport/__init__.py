@@ -1,29 +1,53 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import base64
+import hashlib
+import importlib
 import json
 import logging
 import os
 import pathlib
-import random
-import sqlite3
-import webbrowser
-import xml.etree.ElementTree
-from unittest.mock import MagicMock, patch
+import sys
+import time
 
 import aiohttp
 import shortuuid
 from aiohttp import web
 from cbpi.api import *
-from cbpi.api.base import CBPiBase
 from cbpi.api.config import ConfigType
-from cbpi.api.dataclasses import NotificationAction, NotificationType
-from cbpi.controller.kettle_controller import KettleController
-from voluptuous.schema_builder import message
+from cbpi.api.dataclasses import NotificationType
+
+from . import brewfather, mmum
+from .cache import FileHashes, Plan, PlanCache, settings_key
+from .executor import ParseExecutor
+from .jobs import ImportContext, ImportQueue
+from .metrics import ImportMetrics
+from .plan import StepPlanBuilder
+from .search import MODULES, RecipeSearch, build_bf_index, build_index
+from .settings import SettingsSnapshot
+from .upload import EXTENSIONS, UploadStore, detect_source
 
 logger = logging.getLogger(__name__)
 
 
+# kbh (sqlite3), beerxml (xml.etree) and profiler (cProfile, tracemalloc) are imported on first use.
+# brewfather and mmum only need modules that are already loaded by cbpi (aiohttp, json)
+def lazy_module(name):
+    return importlib.import_module("." + name, __name__)
+
+
+def loaded_module(name):
+    # returns the module only if it has been imported already
+    return sys.modules.get(__name__ + "." + name)
+
+# recipe sources: label for notifications, file in the upload folder and message if the file is missing
+SOURCES = {
+    "kbh": ("KBH", "kbh.db", "Please upload a kbh V2 database file"),
+    "xml": ("BeerXML", "beer.xml", "Please upload a Beer.xml File"),
+    "json": ("MMuM-JSON", "mmum.json", "Please upload a MMuM-JSON File"),
+    "bf": ("Brewfather App", None, None),
+}
+
+
 class RecipeCreation(CBPiExtension):
     def __init__(self, cbpi):
         self.cbpi = cbpi
@@ -33,1206 +57,942 @@ class RecipeCreation(CBPiExtension):
         # this needs to be set in the parameter RECIPE_CREATION_PATH in the global cbpi setting to be able to use the plugin
         # After the change, the plugin replaces the recipe cbpi4 conmtroller for recipe creation
         self.cbpi.register(self, "/creation")
+        self.session = None
+        self.executor = None
+        self.bf_catalog = brewfather.Catalog(
+            self.cbpi.config_folder.get_file_path("brewfather")
+        )
+        self.bf_catalog_task = None
+        self.batch_progress = {}
+        self.queue = None
+        # only one import at a time may change the mash profile
+        self.profile_lock = asyncio.Lock()
+        # cProfile can only run once at a time
+        self.profiler_lock = asyncio.Lock()
+        self.metrics = ImportMetrics()
+        self.settings = SettingsSnapshot(self.resolve_config)
+        self.plans = PlanCache()
+        self.file_hashes = FileHashes()
+        self.search = RecipeSearch()
+        self.uploads = UploadStore(
+            self.cbpi.config_folder.get_upload_file("recipe_import")
+        )
+        self.metrics.gauge(
+            "recipe_import_cache_entries",
+            "Entries in the caches of the plugin",
+            ("cache",),
+            lambda: {
+                ("plans",): len(self.plans.entries),
+                ("mmum",): len(mmum.documents.entries),
+                ("bf_catalog",): len(self.bf_catalog.bodies),
+            },
+        )
+        # registered before the app is started, the signals of a running app are frozen
+        self.cbpi.app.on_cleanup.append(self.shutdown)
         self._task = asyncio.create_task(self.run())
 
     async def run(self):
         logger.info("Starting Recipe Import Plugin")
+        await asyncio.to_thread(self.create_upload_folder)
+        await asyncio.to_thread(self.uploads.load)
+        await self.RecipeSettings()
+        self.plans.size = int(self.cbpi.config.get("recipe_import_plan_cache_size", 32))
+        # settings snapshot is rebuilt after changes of the config or the kettles
+        config_observed = self.settings.observe(self.cbpi.config, "set", "add")
+        kettle_observed = self.settings.observe(
+            self.cbpi.kettle, "add", "update", "delete", "save"
+        )
+        # kettle and sensor of the snapshot come from the kettle controller -> both have to be observed
+        self.settings.observed = config_observed and kettle_observed
+        # one keep-alive connection pool for all api calls of the plugin (step creation and brewfather download)
+        self.session = self.create_session()
+        self.bf_catalog_task = asyncio.create_task(self.bf_catalog_job())
+        # the snapshot is built at startup, not by the first import
+        self.settings.get()
+        pass
+
+    def create_upload_folder(self):
         if os.path.exists(os.path.join(".", "config", "upload")) is False:
             logger.info("Creating Upload folder")
             pathlib.Path(os.path.join(".", "config/upload")).mkdir(
                 parents=True, exist_ok=True
             )
-        await self.RecipeSettings()
-        pass
+
+    async def shutdown(self, app=None):
+        if self.queue is not None:
+            self.queue.close()
+            self.queue = None
+        if self.bf_catalog_task is not None:
+            self.bf_catalog_task.cancel()
+        if getattr(self, "executor", None) is not None:
+            self.executor.shutdown()
+            self.executor = None
+        kbh = loaded_module("kbh")
+        if kbh is not None:
+            kbh.close()
+        if self.session is not None and not self.session.closed:
+            logger.info("Closing Recipe Import http session")
+            await self.session.close()
+        self.session = None
+
+    def create_session(self):
+        limit = int(self.cbpi.config.get("recipe_import_connection_limit", 4))
+        timeout = float(self.cbpi.config.get("recipe_import_timeout", 30))
+        connector = aiohttp.TCPConnector(
+            limit=limit, limit_per_host=limit, keepalive_timeout=60
+        )
+        return aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+        )
+
+    def get_session(self):
+        # session may not exist yet if an import is triggered before run() has finished
+        if getattr(self, "session", None) is None or self.session.closed:
+            self.session = self.create_session()
+        return self.session
 
     async def RecipeSettings(self):
         TEMP_UNIT = self.cbpi.config.get("TEMP_UNIT", "C")
         self.default_boil_temp = 99 if TEMP_UNIT == "C" else 212
         self.default_cool_temp = 20 if TEMP_UNIT == "C" else 68
 
+        connection_limit = self.cbpi.config.get("recipe_import_connection_limit", None)
+        if connection_limit is None:
+            logger.info("INIT recipe_import_connection_limit")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_connection_limit",
+                    4,
+                    type=ConfigType.NUMBER,
+                    description="Max. number of parallel connections used by the recipe import",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        timeout = self.cbpi.config.get("recipe_import_timeout", None)
+        if timeout is None:
+            logger.info("INIT recipe_import_timeout")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_timeout",
+                    30,
+                    type=ConfigType.NUMBER,
+                    description="Timeout in seconds for api calls of the recipe import",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        workers = self.cbpi.config.get("recipe_import_workers", None)
+        if workers is None:
+            logger.info("INIT recipe_import_workers")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_workers",
+                    1,
+                    type=ConfigType.NUMBER,
+                    description="Number of workers used to parse recipe files (requires restart)",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        executor = self.cbpi.config.get("recipe_import_executor", None)
+        if executor is None:
+            logger.info("INIT recipe_import_executor")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_executor",
+                    "thread",
+                    type=ConfigType.SELECT,
+                    description="Parse recipe files in threads or in separate processes (requires restart)",
+                    source="cbpi4-RecipeImport",
+                    options=[
+                        {"label": "Thread", "value": "thread"},
+                        {"label": "Process", "value": "process"},
+                    ],
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        ttl = self.cbpi.config.get("recipe_import_bf_cache_ttl", None)
+        if ttl is None:
+            logger.info("INIT recipe_import_bf_cache_ttl")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_bf_cache_ttl",
+                    3600,
+                    type=ConfigType.NUMBER,
+                    description="Seconds a downloaded Brewfather recipe is used without asking Brewfather for changes",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        interval = self.cbpi.config.get("recipe_import_bf_catalog_interval", None)
+        if interval is None:
+            logger.info("INIT recipe_import_bf_catalog_interval")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_bf_catalog_interval",
+                    60,
+                    type=ConfigType.NUMBER,
+                    description="Minutes between updates of the local Brewfather recipe catalog (0: no catalog, requires restart)",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        parallel_jobs = self.cbpi.config.get("recipe_import_parallel_jobs", None)
+        if parallel_jobs is None:
+            logger.info("INIT recipe_import_parallel_jobs")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_parallel_jobs",
+                    4,
+                    type=ConfigType.NUMBER,
+                    description="Number of recipe imports processed in parallel (requires restart)",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        boil_alerts = self.cbpi.config.get("recipe_import_boil_alerts", None)
+        if boil_alerts is None:
+            logger.info("INIT recipe_import_boil_alerts")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_boil_alerts",
+                    6,
+                    type=ConfigType.NUMBER,
+                    description="Number of hop alerts of the boil step. More additions are moved to a second boil step",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
+        plan_cache_size = self.cbpi.config.get("recipe_import_plan_cache_size", None)
+        if plan_cache_size is None:
+            logger.info("INIT recipe_import_plan_cache_size")
+            try:
+                await self.cbpi.config.add(
+                    "recipe_import_plan_cache_size",
+                    32,
+                    type=ConfigType.NUMBER,
+                    description="Number of converted recipes kept in memory (0: no cache, requires restart)",
+                    source="cbpi4-RecipeImport",
+                )
+            except:
+                logger.warning("Unable to update config")
+
     # register individual routes for each recipe source (they will use the path under '/creation' from above)
     @request_mapping(path="/kbh", method="POST", auth_required=False)
     async def create_kbh_recipe(self, request):
         kbh_id = await request.json()
-        await self.kbh_recipe_creation(kbh_id["id"])
-        return web.Response(status=200)
+        return await self.start_job("kbh", kbh_id["id"], kbh_id.get("profile", False))
 
     @request_mapping(path="/xml", method="POST", auth_required=False)
     async def create_xml_recipe(self, request):
         xml_id = await request.json()
-        await self.xml_recipe_creation(xml_id["id"])
-        return web.Response(status=200)
+        return await self.start_job("xml", xml_id["id"], xml_id.get("profile", False))
 
     @request_mapping(path="/bf", method="POST", auth_required=False)
     async def create_bf_recipe(self, request):
         bf_id = await request.json()
-        await self.bf_recipe_creation(bf_id["id"])
-        return web.Response(status=200)
+        return await self.start_job("bf", bf_id["id"], bf_id.get("profile", False))
 
     @request_mapping(path="/json", method="POST", auth_required=False)
     async def create_json_recipe(self, request):
         json_id = await request.json()
-        await self.json_recipe_creation(json_id["id"])
-        return web.Response(status=200)
-
-    # function to create a recipe from the Kleiner Brauhelfer database
-    async def kbh_recipe_creation(self, Recipe_ID):
-        config = self.get_config_values()
-        if self.kettle is not None:
-            # check if kbh database is available in the upload folder and connect to it
-            self.path = self.cbpi.config_folder.get_upload_file("kbh.db")
-            if os.path.exists(self.path) is False:
-                self.cbpi.notify(
-                    "File Not Found",
-                    "Please upload a kbh V2 database file",
-                    NotificationType.ERROR,
-                )
-
-            try:
-                # Get Recipe Nmae
-                conn = sqlite3.connect(self.path)
-                c = conn.cursor()
-                c.execute("SELECT Sudname FROM Sud WHERE ID = ?", (Recipe_ID,))
-                row = c.fetchone()
-                name = row[0]
-                # get MashIn Temp
-                mashin_temp = None
-                c.execute(
-                    "SELECT TempWasser FROM Maischplan WHERE Typ = 0 AND SudID = ?",
-                    (Recipe_ID,),
+        return await self.start_job("json", json_id["id"], json_id.get("profile", False))
+
+    # recipes of a source (id, name, boil time, number of mash steps, last change), sorted by id.
+    # Query: after (id of the last recipe of the previous page, "next" of the response), limit (default 50, max. 500)
+    @request_mapping(path="/{source}/list", method="GET", auth_required=False)
+    async def list_recipes(self, request):
+        source = request.match_info["source"]
+        if source not in SOURCES:
+            return web.json_response(
+                {"error": "Unknown source {}".format(source)}, status=400
+            )
+        after = request.query.get("after") or None
+        try:
+            limit = min(max(int(request.query.get("limit", 50)), 1), 500)
+            if source == "bf":
+                recipes, total = self.bf_catalog.list(after, limit)
+            else:
+                path = await self.source_path(source)
+                module = lazy_module(MODULES[source])
+                recipes, total = await self.parse(module.list_recipes, path, after, limit)
+        except FileNotFoundError:
+            return web.json_response({"error": SOURCES[source][2]}, status=404)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        next_after = recipes[-1]["id"] if len(recipes) == limit else None
+        return web.json_response(
+            {"source": source, "total": total, "recipes": recipes, "next": next_after}
+        )
+
+    # full text search in names, styles, hops and miscs of the recipes of all sources.
+    # Query: q (required), limit (default 20, max. 500), source (comma separated, default all)
+    @request_mapping(path="/search", method="GET", auth_required=False)
+    async def search_recipes(self, request):
+        start = time.perf_counter()
+        query = request.query.get("q", "").strip()
+        if not query:
+            return web.json_response({"error": "Parameter q is missing"}, status=400)
+        try:
+            limit = min(max(int(request.query.get("limit", 20)), 1), 500)
+        except ValueError:
+            return web.json_response({"error": "limit must be a number"}, status=400)
+        sources = request.query.get("source")
+        sources = sources.split(",") if sources else list(SOURCES)
+        results = []
+        for source in sources:
+            if source not in SOURCES:
+                return web.json_response(
+                    {"error": "Unknown source {}".format(source)}, status=400
                 )
-                row = c.fetchone()
-                try:
-                    if self.cbpi.config.get("TEMP_UNIT", "C") == "C":
-                        mashin_temp = str(int(row[0]))
-                    else:
-                        mashin_temp = str(round(9.0 / 5.0 * int(row[0]) + 32))
-                except:
-                    pass
-                # get the hop addition times
-                c.execute(
-                    "SELECT Zeit, Name FROM Hopfengaben WHERE Vorderwuerze <> 1 AND SudID = ?",
-                    (Recipe_ID,),
+            index = await self.search_index(source)
+            if index is None:
+                continue
+            for score, document in index.search(query):
+                results.append(dict(document, source=source, score=score))
+        results.sort(key=lambda r: (-r["score"], r["source"], str(r["name"])))
+        return web.json_response(
+            {
+                "query": query,
+                "total": len(results),
+                "results": results[:limit],
+                "ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+        )
+
+    # upload of kbh.db, beer.xml or mmum.json files (multipart). The file is streamed to disk and stored under its hash.
+    # The source is taken from the field "source" (sent before the file) or from the file extension
+    @request_mapping(path="/upload", method="POST", auth_required=False)
+    async def upload_file(self, request):
+        reader = await request.multipart()
+        source = None
+        results = []
+        async for part in reader:
+            if part.filename is None:
+                if part.name == "source":
+                    source = (await part.text()).strip()
+                continue
+            part_source = source or detect_source(part.filename)
+            if part_source not in EXTENSIONS:
+                return web.json_response(
+                    {"error": "Unknown source for {}".format(part.filename)},
+                    status=400,
                 )
-                hops = c.fetchall()
-                whirlpool = []
-                for hop in hops:
-                    if hop[0] < 0:
-                        whirlpool.append(hop)
-                for whirl in whirlpool:
-                    hops.remove(whirl)
-                # get the misc addition times
-                c.execute(
-                    "SELECT Zugabedauer, Name FROM WeitereZutatenGaben WHERE Zeitpunkt = 1 AND SudID = ?",
-                    (Recipe_ID,),
+            name = os.path.basename(part.filename)
+            entry, replaced = await self.uploads.store(part, part_source, name)
+            path = self.uploads.path(entry["hash"], part_source)
+            await asyncio.to_thread(self.file_hashes.add, path, entry["hash"])
+            if replaced is not None and replaced["hash"] != entry["hash"]:
+                # the caches wait for parsers that may hold them for a while -> not on the event loop
+                await asyncio.to_thread(
+                    self.release_file, self.uploads.path(replaced["hash"], part_source)
                 )
-                miscs = c.fetchall()
-                try:
-                    c.execute(
-                        "SELECT Zeit, Name FROM Hopfengaben WHERE Vorderwuerze = 1 AND SudID = ?",
-                        (Recipe_ID,),
+                if not self.uploads.referenced(replaced["hash"], part_source):
+                    await asyncio.to_thread(
+                        self.uploads.remove, replaced["hash"], part_source
                     )
-                    FW_Hops = c.fetchall()
-                    FirstWort = self.getFirstWort(FW_Hops, "kbh")
-                except:
-                    FirstWort = "No"
-
-                # get the boiltime from the database
-                c.execute("SELECT Kochdauer FROM Sud WHERE ID = ?", (Recipe_ID,))
-                row = c.fetchone()
-                BoilTime = str(int(row[0]))
-
-                await self.create_recipe(name)
-
-                # create a mashin step if mashin_temp is available (just heating up to temp and waiting for user input)
-                if mashin_temp is not None:
-                    step_type = self.mashin if self.mashin != "" else "MashInStep"
-                    step_string = {
-                        "name": "MashIn",
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": mashin_temp,
-                            "Timer": "0",
-                            "Notification": "Target temperature reached. Please add malt.",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": step_type,
-                    }
-                    await self.create_step(step_string)
-
-                # if mashin_temp is not available, create a mashin step with the temp of the first mash step if addmashin is set to yes
-                for row in c.execute(
-                    "SELECT Name, TempRast, DauerRast FROM Maischplan WHERE Typ <> 0 AND SudID = ?",
-                    (Recipe_ID,),
-                ):
-                    if mashin_temp is None and self.addmashin == "Yes":
-                        step_type = self.mashin if self.mashin != "" else "MashInStep"
-                        step_string = {
-                            "name": "MashIn",
-                            "props": {
-                                "AutoMode": self.AutoMode,
-                                "Kettle": self.id,
-                                "Sensor": self.kettle.sensor,
-                                "Temp": (
-                                    str(int(row[1]))
-                                    if self.TEMP_UNIT == "C"
-                                    else str(round(9.0 / 5.0 * int(row[1]) + 32))
-                                ),
-                                "Timer": "0",
-                                "Notification": "Target temperature reached. Please add malt.",
-                            },
-                            "status_text": "",
-                            "status": "I",
-                            "type": step_type,
-                        }
-                        await self.create_step(step_string)
-
-                    # create the mash steps based on the recipe settings (time and temp)
-                    step_type = self.mash if self.mash != "" else "MashStep"
-                    step_string = {
-                        "name": str(row[0]),
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": (
-                                str(int(row[1]))
-                                if self.TEMP_UNIT == "C"
-                                else str(round(9.0 / 5.0 * int(row[1]) + 32))
-                            ),
-                            "Timer": str(int(row[2])),
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": step_type,
-                    }
-                    await self.create_step(step_string)
-
-                # MashOut -> Notification step that sends notification and waits for user input to move to next step (AutoNext=No)
-                if self.mashout == "NotificationStep":
-                    step_string = {
-                        "name": "Lautering",
-                        "props": {
-                            "AutoNext": "No",
-                            "Kettle": self.id,
-                            "Notification": "Mash Process completed. Please start lautering and press next to start boil.",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": self.mashout,
-                    }
-                    await self.create_step(step_string)
-
-                # create a boil step with hop alarms and alarm for first wort hops
-                Hops = self.getBoilAlerts(hops, miscs, "kbh")
-                step_type = self.boil if self.boil != "" else "BoilStep"
-                step_string = {
-                    "name": "Boil Step",
-                    "props": {
-                        "AutoMode": self.AutoMode,
-                        "Kettle": self.boilid,
-                        "Sensor": self.boilkettle.sensor,
-                        "Temp": int(self.BoilTemp),
-                        "Timer": BoilTime,
-                        "First_Wort": FirstWort[0],
-                        "First_Wort_text": FirstWort[1],
-                        "LidAlert": "Yes",
-                        "Hop_1": Hops[0][0],
-                        "Hop_1_text": Hops[0][1],
-                        "Hop_2": Hops[1][0],
-                        "Hop_2_text": Hops[1][1],
-                        "Hop_3": Hops[2][0],
-                        "Hop_3_text": Hops[2][1],
-                        "Hop_4": Hops[3][0],
-                        "Hop_4_text": Hops[3][1],
-                        "Hop_5": Hops[4][0],
-                        "Hop_5_text": Hops[4][1],
-                        "Hop_6": Hops[5][0],
-                        "Hop_6_text": Hops[5][1],
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": step_type,
-                }
-
-                await self.create_step(step_string)
-
-                # create a whirlpool step with optional cooldown
-                if not whirlpool:
-                    await self.create_Whirlpool_Cooldown()
-                else:
-                    await self.create_Whirlpool_Cooldown(
-                        str(abs(whirlpool[0][0]))
-                    )  # from kbh this value comes as negative but must be positive
-
-                self.cbpi.notify("KBH Recipe created", name, NotificationType.INFO)
-
-            except Exception as e:
-                self.cbpi.notify(
-                    "KBH Recipe creation failure: {}".format(e),
-                    name,
-                    NotificationType.ERROR,
-                )
-                pass
-        else:
-            self.cbpi.notify(
-                "Recipe Upload",
-                "No default Kettle defined. Please specify default Kettle in settings",
-                NotificationType.ERROR,
+            logger.info(
+                "Recipe file %s (%s) uploaded: %s" % (name, part_source, entry["hash"])
             )
-
-    def findMax(self, string):
-        self.path = self.cbpi.config_folder.get_upload_file("mmum.json")
-        e = json.load(open(self.path))
-        for idx in range(1, 20):
-            search_string = string.replace("%%", str(idx))
-            i = idx
-            if search_string not in e:
-                break
-        return i
-
-    def getJsonMashin(self, id):
-        self.path = self.cbpi.config_folder.get_upload_file("mmum.json")
-        e = json.load(open(self.path))
-        return float(e["Infusion_Einmaischtemperatur"])
-
-    # function to create a recipe from a MUMM json recipe file
-    async def json_recipe_creation(self, Recipe_ID):
-        config = self.get_config_values()
+            results.append(entry)
+        if not results:
+            return web.json_response({"error": "No file uploaded"}, status=400)
+        return web.json_response(results)
+
+    # uploaded files and the active file of each source
+    @request_mapping(path="/upload", method="GET", auth_required=False)
+    async def get_uploads(self, request):
+        return web.json_response(self.uploads.manifest)
+
+    # dry run: returns the steps of a recipe without changing the mash profile. Body: {"source": "kbh", "id": 1}
+    @request_mapping(path="/plan", method="POST", auth_required=False)
+    async def get_plan(self, request):
+        data = await request.json()
+        source = data.get("source")
+        if source not in SOURCES:
+            return web.json_response(
+                {"error": "Unknown source {}".format(source)}, status=400
+            )
+        config = self.settings.get()
+        if config["kettle"] is None:
+            return web.json_response(
+                {"error": "No default Kettle defined"}, status=400
+            )
+        context = ImportContext.create(source, data.get("id"), config, "plan")
         try:
-            if self.kettle is not None:
-                # check if  mmum-json file is located in upload folder and load it
-                self.path = self.cbpi.config_folder.get_upload_file("mmum.json")
-                if os.path.exists(self.path) is False:
-                    self.cbpi.notify(
-                        "File Not Found",
-                        "Please upload a MMuM-JSON File",
-                        NotificationType.ERROR,
-                    )
-
-                e = json.load(open(self.path))
-                name = e["Name"]
-                boil_time = float(e["Kochzeit_Wuerze"])
-
-                await self.create_recipe(name)
-
-                # get the hop addition times
-                hops = []
-                for idx in range(1, self.findMax("Hopfen_%%_Kochzeit")):
-                    hops_name = "%sg %s %s%% alpha" % (
-                        e["Hopfen_{}_Menge".format(idx)],
-                        e["Hopfen_{}_Sorte".format(idx)],
-                        e["Hopfen_{}_alpha".format(idx)],
-                    )
-                    if e["Hopfen_{}_Kochzeit".format(idx)].isnumeric():
-                        if (
-                            boil_time
-                            is not e["Hopfen_{}_Kochzeit".format(idx)].isnumeric()
-                        ):
-                            alert = float(e["Hopfen_{}_Kochzeit".format(idx)])
-                    elif (
-                        e["Hopfen_{}_Kochzeit".format(idx)] == "Whirlpool"
-                        or float(e["Hopfen_{}_Kochzeit".format(idx)]) < 0
-                    ):
-                        alert = float(0)
-                        hops_name = hops_name + " whirlpool"
-                    else:
-                        self.cbpi.notify(
-                            "No Number at Hoptime",
-                            "Please change json-File at Hopfen_{}_Kochzeit".format(idx),
-                            NotificationType.ERROR,
-                        )
-                        alert = float(0)
-                    hops.append({"name": hops_name, "time": alert})
-
-                firstHops = []
-                for idx in range(1, self.findMax("Hopfen_VWH_%%_Sorte")):
-                    firstHops_name = "%sg %s %s%% alpha" % (
-                        e["Hopfen_VWH_{}_Menge".format(idx)],
-                        e["Hopfen_VWH_{}_Sorte".format(idx)],
-                        e["Hopfen_VWH_{}_alpha".format(idx)],
-                    )
-
-                    firstHops.append({"name": firstHops_name})
-
-                FirstWort = self.getFirstWort(firstHops, "json")
-
-                miscs = []
-                for idx in range(1, self.findMax("WeitereZutat_Wuerze_%%_Kochzeit")):
-                    miscs_name = "%s%s %s" % (
-                        e["WeitereZutat_Wuerze_{}_Menge".format(idx)],
-                        e["WeitereZutat_Wuerze_{}_Einheit".format(idx)],
-                        e["WeitereZutat_Wuerze_{}_Name".format(idx)],
-                    )
-                    if e["WeitereZutat_Wuerze_{}_Kochzeit".format(idx)].isnumeric():
-                        alert = float(e["WeitereZutat_Wuerze_{}_Kochzeit".format(idx)])
-                    elif (
-                        e["WeitereZutat_Wuerze_{}_Kochzeit".format(idx)] == "Whirlpool"
-                        or float(e["WeitereZutat_Wuerze_{}_Kochzeit".format(idx)]) < 0
-                    ):
-                        alert = float(0)
-                        miscs_name = miscs_name + " whirlpool"
-                    else:
-                        self.api.notify(
-                            headline="No Number at Hoptime",
-                            message="Please change json-File at WeitereZutat_Wuerze_{}_Kochzeit".format(
-                                idx
-                            ),
-                            type="danger",
-                        )
-                        alert = float(0)
-                    miscs.append({"name": miscs_name, "time": alert})
-
-                # Mash Steps -> first step is different as it heats up to defined temp and stops with notification to add malt
-                # AutoMode is yes to start and stop automatic mode or each step
-                MashIn_Flag = True
-                step_kettle = self.id
-                last_step_temp = 0
-                logging.info(
-                    step_kettle
-                )  ###################################################
-                for row in self.getSteps(Recipe_ID, "json"):
-                    step_name = str(row.get("name"))
-                    step_timer = str(int(row.get("timer")))
-                    step_temp = str(int(row.get("temp")))
-                    last_step_temp = step_temp
-                    sensor = self.kettle.sensor
-                    if MashIn_Flag == True:
-                        if row.get("timer") == 0:
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-                            if step_name is None or step_name == "":
-                                step_name = "MashIn"
-                        elif self.addmashin == "Yes":
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-                            step_string = {
-                                "name": "MashIn",
-                                "props": {
-                                    "AutoMode": self.AutoMode,
-                                    "Kettle": self.id,
-                                    "Sensor": self.kettle.sensor,
-                                    "Temp": self.getJsonMashin(Recipe_ID),
-                                    "Timer": 0,
-                                    "Notification": Notification,
-                                },
-                                "status_text": "",
-                                "status": "I",
-                                "type": step_type,
-                            }
-                            await self.create_step(step_string)
-                            logging.info(
-                                step_kettle
-                            )  ###################################################
-
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-                        else:
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-
-                    else:
-                        step_type = self.mash if self.mash != "" else "MashStep"
-                        Notification = ""
-
-                    step_string = {
-                        "name": step_name,
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": step_temp,
-                            "Timer": step_timer,
-                            "Notification": Notification,
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": step_type,
-                    }
-
-                    await self.create_step(step_string)
-                # MashOut -> mashStep to reach mashout-temp for 1 min
-                if last_step_temp != e["Abmaischtemperatur"]:
-                    step_string = {
-                        "name": "MashOut",
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": e["Abmaischtemperatur"],
-                            "Timer": 1,
-                            "Notification": "",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": "MashStep",
-                    }
-
-                    await self.create_step(step_string)
-                # Lautering -> Simple step that sends notification and waits for user input to move to next step (AutoNext=No)
-                if self.mashout == "NotificationStep":
-                    step_string = {
-                        "name": "Lautering",
-                        "props": {
-                            "AutoNext": "No",
-                            "Kettle": self.id,
-                            "Notification": "Mash Process completed. Please start lautering and press next to start boil.",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": self.mashout,
-                    }
-                    await self.create_step(step_string)
-
-                # Measure Original Gravity -> Simple step that sends notification
-                step_string = {
-                    "name": "Measure Original Gravity",
-                    "props": {
-                        "AutoNext": "No",
-                        "Kettle": self.id,
-                        "Notification": "What is the original gravity of the beer wort?",
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": "NotificationStep",
-                }
-                await self.create_step(step_string)
-
-                # Boil step including hop alarms and alarm for first wort hops -> Automode is set tu yes
-                Hops = self.getBoilAlerts(hops, miscs, "json")
-                step_kettle = self.boilid
-                step_type = self.boil if self.boil != "" else "BoilStep"
-                step_time = str(int(boil_time))
-                step_temp = self.BoilTemp
-                sensor = self.boilkettle.sensor
-                LidAlert = "Yes"
-
-                logging.info(
-                    step_temp
-                )  ###################################################
-
-                step_string = {
-                    "name": "Boil Step",
-                    "props": {
-                        "AutoMode": self.AutoMode,
-                        "Kettle": step_kettle,
-                        "Sensor": sensor,
-                        "Temp": step_temp,
-                        "Timer": step_time,
-                        "First_Wort": FirstWort[0],
-                        "First_Wort_text": FirstWort[1],
-                        "LidAlert": LidAlert,
-                        "Hop_1": Hops[0][0],
-                        "Hop_1_text": Hops[0][1],
-                        "Hop_2": Hops[1][0],
-                        "Hop_2_text": Hops[1][1],
-                        "Hop_3": Hops[2][0],
-                        "Hop_3_text": Hops[2][1],
-                        "Hop_4": Hops[3][0],
-                        "Hop_4_text": Hops[3][1],
-                        "Hop_5": Hops[4][0],
-                        "Hop_5_text": Hops[4][1],
-                        "Hop_6": Hops[5][0],
-                        "Hop_6_text": Hops[5][1],
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": step_type,
-                }
-
-                await self.create_step(step_string)
-
-                # Measure Original Gravity -> Simple step that sends notification
-                step_string = {
-                    "name": "Measure Original Gravity",
-                    "props": {
-                        "AutoNext": "No",
-                        "Kettle": self.id,
-                        "Notification": "What is the original gravity of the beer wort?",
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": "NotificationStep",
-                }
-                await self.create_step(step_string)
-
-                await self.create_Whirlpool_Cooldown()
-
-                self.cbpi.notify(
-                    "MMuM-JSON Recipe created ", name, NotificationType.INFO
-                )
-            else:
-                self.cbpi.notify(
-                    "Recipe Upload",
-                    "No default Kettle defined. Please specify default Kettle in settings",
-                    NotificationType.ERROR,
-                )
+            plan, cached = await self.load_plan(context)
+        except FileNotFoundError:
+            return web.json_response({"error": SOURCES[source][2]}, status=404)
         except Exception as e:
-            self.cbpi.notify(
-                "MMuM-JSON Recipe creation failure: {}".format(e),
-                name,
-                NotificationType.ERROR,
-            )
             logger.error(e)
-
-    async def xml_recipe_creation(self, Recipe_ID):
-        config = self.get_config_values()
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(
+            {
+                "name": plan.name,
+                "steps": plan.steps,
+                "warnings": list(plan.warnings),
+                "cached": cached,
+            }
+        )
+
+    # profile (cProfile and tracemalloc) of the conversion of a recipe, nothing is written to the mash profile.
+    # Body: {"source": "kbh", "id": 1}. Add "profile": true to the body of an import to profile a complete import
+    @request_mapping(path="/profile", method="POST", auth_required=False)
+    async def profile_recipe(self, request):
+        data = await request.json()
+        source = data.get("source")
+        if source not in SOURCES:
+            return web.json_response(
+                {"error": "Unknown source {}".format(source)}, status=400
+            )
+        config = self.settings.get()
+        if config["kettle"] is None:
+            return web.json_response(
+                {"error": "No default Kettle defined"}, status=400
+            )
+        context = ImportContext.create(source, data.get("id"), config, "plan", True)
+        job = await self.get_queue().submit(context)
+        await asyncio.wait([job.future])
+        if job.future.cancelled():
+            return web.json_response(job.to_dict(), status=409)
+        if job.future.exception() is not None:
+            return web.json_response({"error": str(job.error)}, status=400)
+        return web.json_response(job.result)
+
+    # metrics of the imports in Prometheus text format
+    @request_mapping(path="/metrics", method="GET", auth_required=False)
+    async def get_metrics(self, request):
+        return web.Response(
+            text=self.metrics.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    # import jobs: state and progress of an import, cancel a job
+    @request_mapping(path="/jobs", method="GET", auth_required=False)
+    async def get_jobs(self, request):
+        return web.json_response(
+            [job.to_dict() for job in self.get_queue().jobs.values()]
+        )
+
+    @request_mapping(path="/jobs/{id}", method="GET", auth_required=False)
+    async def get_job(self, request):
+        job = self.get_queue().get(request.match_info["id"])
+        if job is None:
+            return web.json_response({"error": "Unknown job"}, status=404)
+        return web.json_response(job.to_dict())
+
+    @request_mapping(path="/jobs/{id}", method="DELETE", auth_required=False)
+    async def cancel_job(self, request):
+        job = self.get_queue().get(request.match_info["id"])
+        if job is None:
+            return web.json_response({"error": "Unknown job"}, status=404)
+        if not job.cancel():
+            return web.json_response(job.to_dict(), status=409)
+        return web.json_response(job.to_dict())
+
+    # imports many recipes of one source into the recipe book. Body: {"source": "kbh", "ids": [1, 2] or "all"}
+    @request_mapping(path="/batch", method="POST", auth_required=False)
+    async def create_batch(self, request):
+        data = await request.json()
+        source = data.get("source")
+        if source not in SOURCES:
+            return web.json_response(
+                {"error": "Unknown source {}".format(source)}, status=400
+            )
         try:
-            if self.kettle is not None:
-                # load beerxml file located in upload folder
-                self.path = self.cbpi.config_folder.get_upload_file("beer.xml")
-                if os.path.exists(self.path) is False:
-                    self.cbpi.notify(
-                        "File Not Found",
-                        "Please upload a Beer.xml File",
-                        NotificationType.ERROR,
-                    )
-
-                e = xml.etree.ElementTree.parse(self.path).getroot()
-                recipe = e.find("./RECIPE[%s]" % (str(Recipe_ID)))
-                hops = recipe.findall("./HOPS/HOP")
-                miscs = recipe.findall('MISCS/MISC[USE="Boil"]')
-                name = e.find("./RECIPE[%s]/NAME" % (str(Recipe_ID))).text
-                boil_time = float(
-                    e.find("./RECIPE[%s]/BOIL_TIME" % (str(Recipe_ID))).text
-                )
-                FirstWort = self.getFirstWort(hops, "xml")
-
-                await self.create_recipe(name)
-                # Mash Steps -> first step is different as it heats up to defined temp and stops with notification to add malt
-                # AutoMode is yes to start and stop automatic mode or each step
-                MashIn_Flag = True
-                step_kettle = self.id
-                for row in self.getSteps(Recipe_ID, "xml"):
-                    step_name = str(row.get("name"))
-                    step_timer = str(int(row.get("timer")))
-                    step_temp = str(int(row.get("temp")))
-                    sensor = self.kettle.sensor
-                    if MashIn_Flag == True:
-                        if row.get("timer") == 0:
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-                            if step_name is None or step_name == "":
-                                step_name = "MashIn"
-                        elif self.addmashin == "Yes":
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-                            step_string = {
-                                "name": "MashIn",
-                                "props": {
-                                    "AutoMode": self.AutoMode,
-                                    "Kettle": self.id,
-                                    "Sensor": self.kettle.sensor,
-                                    "Temp": step_temp,
-                                    "Timer": 0,
-                                    "Notification": Notification,
-                                },
-                                "status_text": "",
-                                "status": "I",
-                                "type": step_type,
-                            }
-                            await self.create_step(step_string)
-
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-                        else:
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-
-                    else:
-                        step_type = self.mash if self.mash != "" else "MashStep"
-                        Notification = ""
-
-                    step_string = {
-                        "name": step_name,
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": step_temp,
-                            "Timer": step_timer,
-                            "Notification": Notification,
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": step_type,
-                    }
-
-                    await self.create_step(step_string)
-
-                # MashOut -> Simple step that sends notification and waits for user input to move to next step (AutoNext=No)
-                if self.mashout == "NotificationStep":
-                    step_string = {
-                        "name": "Lautering",
-                        "props": {
-                            "AutoNext": "No",
-                            "Kettle": self.id,
-                            "Notification": "Mash Process completed. Please start lautering and press next to start boil.",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": self.mashout,
-                    }
-                    await self.create_step(step_string)
-
-                # Boil step including hop alarms and alarm for first wort hops -> Automode is set tu yes
-                Hops = self.getBoilAlerts(hops, miscs, "xml")
-                step_kettle = self.boilid
-                step_type = self.boil if self.boil != "" else "BoilStep"
-                step_time = str(int(boil_time))
-                step_temp = self.BoilTemp
-                sensor = self.boilkettle.sensor
-                LidAlert = "Yes"
-
-                step_string = {
-                    "name": "Boil Step",
-                    "props": {
-                        "AutoMode": self.AutoMode,
-                        "Kettle": step_kettle,
-                        "Sensor": sensor,
-                        "Temp": step_temp,
-                        "Timer": step_time,
-                        "First_Wort": FirstWort[0],
-                        "First_Wort_text": FirstWort[1],
-                        "LidAlert": LidAlert,
-                        "Hop_1": Hops[0][0],
-                        "Hop_1_text": Hops[0][1],
-                        "Hop_2": Hops[1][0],
-                        "Hop_2_text": Hops[1][1],
-                        "Hop_3": Hops[2][0],
-                        "Hop_3_text": Hops[2][1],
-                        "Hop_4": Hops[3][0],
-                        "Hop_4_text": Hops[3][1],
-                        "Hop_5": Hops[4][0],
-                        "Hop_5_text": Hops[4][1],
-                        "Hop_6": Hops[5][0],
-                        "Hop_6_text": Hops[5][1],
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": step_type,
-                }
-
-                await self.create_step(step_string)
-
-                await self.create_Whirlpool_Cooldown()
-
-                self.cbpi.notify("BeerXML Recipe created ", name, NotificationType.INFO)
-            else:
-                self.cbpi.notify(
-                    "Recipe Upload",
-                    "No default Kettle defined. Please specify default Kettle in settings",
-                    NotificationType.ERROR,
-                )
+            ids = data.get("ids", "all")
+            if ids == "all":
+                ids = await self.recipe_ids(source)
+            return web.json_response(await self.batch_import(source, ids))
         except Exception as e:
-            self.cbpi.notify(
-                "BeerXML Recipe creation failure: {}".format(e),
-                name,
-                NotificationType.ERROR,
-            )
             logger.error(e)
+            return web.json_response({"error": str(e)}, status=400)
+
+    # progress of the running or last batch import
+    @request_mapping(path="/batch", method="GET", auth_required=False)
+    async def get_batch(self, request):
+        return web.json_response(self.batch_progress)
+
+    # cache statistics and invalidation (e.g. after a new file has been uploaded)
+    @request_mapping(path="/cache", method="GET", auth_required=False)
+    async def get_cache_stats(self, request):
+        kbh = loaded_module("kbh")
+        # waits for the lock of every kbh catalog, a sync may hold it for a while
+        kbh_stats = await asyncio.to_thread(kbh.stats) if kbh is not None else {}
+        return web.json_response(
+            {
+                "kbh": kbh_stats,
+                "mmum": mmum.documents.stats(),
+                "plans": self.plans.stats(),
+                "search": self.search.stats(),
+            }
+        )
+
+    @request_mapping(path="/cache", method="DELETE", auth_required=False)
+    async def clear_cache(self, request):
+        mmum.documents.invalidate()
+        self.plans.invalidate()
+        return web.Response(status=204)
+
+    def get_executor(self):
+        if getattr(self, "executor", None) is None:
+            self.executor = ParseExecutor(
+                self.cbpi.config.get("recipe_import_workers", 1),
+                self.cbpi.config.get("recipe_import_executor", "thread"),
+            )
+        return self.executor
+
+    # runs a parser in the executor. File access and parsing is never done in the event loop
+    async def parse(self, func, *args):
+        return await self.get_executor().run(func, *args)
+
+    # runs a parser in the event loop (profiling)
+    async def run_inline(self, func, *args):
+        return func(*args)
+
+    def no_kettle(self):
+        self.cbpi.notify(
+            "Recipe Upload",
+            "No default Kettle defined. Please specify default Kettle in settings",
+            NotificationType.ERROR,
+        )
+
+    def get_queue(self):
+        if getattr(self, "queue", None) is None:
+            self.queue = ImportQueue(
+                self.run_import,
+                self.cbpi.config.get("recipe_import_parallel_jobs", 4),
+                on_update=self.job_update,
+            )
+        return self.queue
+
+    def job_update(self, job):
+        if job.done():
+            self.metrics.jobs.inc(job.context.source, job.status)
+            self.metrics.duration.observe(job.finished - job.created, job.context.source)
+        self.push_job(job)
+
+    # sends the state of a job to the ui via websocket
+    def push_job(self, job):
+        ws = getattr(self.cbpi, "ws", None)
+        if ws is not None:
+            ws.send(dict(topic="recipe_import_job", data=job.to_dict()))
+
+    # handler of the import queue. Imports with profiling are run one after the other
+    async def run_import(self, job):
+        if not job.context.profiling:
+            return await self.import_recipe(job)
+        async with self.profiler_lock:
+            profile = lazy_module("profiler").ImportProfile()
+            profile.start()
+            try:
+                result = await self.import_recipe(job)
+            finally:
+                profile.stop()
+            prefix = self.cbpi.config_folder.get_upload_file(
+                "recipe_import_{}".format(job.id)
+            )
+            result["profile"] = await asyncio.to_thread(profile.save, prefix)
+            logger.info("Profile of import %s written to %s.prof" % (job.id, prefix))
+            return result
+
+    # Parsing runs in parallel for several jobs, changes of the mash profile are done by one job after the other
+    async def import_recipe(self, job):
+        context = job.context
+        start = time.perf_counter()
+        job.update(phase="parse")
+        plan, cached = await self.load_plan(context, job)
+        # the cached plan is never handed to cbpi
+        steps = plan.copy_steps()
+        if context.target == "plan":
             pass
+        elif context.target == "book":
+            job.update(phase="write", steps_total=len(steps))
+            with self.metrics.write.time("book"):
+                await self.save_recipe(plan.name, steps)
+        else:
+            async with self.profile_lock:
+                job.update(phase="write", steps_total=len(steps))
+                with self.metrics.create_recipe.time():
+                    await self.create_recipe(plan.name)
+                with self.metrics.write.time("profile"):
+                    await self.write_steps(steps, job)
+        job.steps_done = len(steps)
+        return {
+            "id": context.recipe_id,
+            "name": plan.name,
+            "steps": len(steps),
+            "warnings": list(plan.warnings),
+            "cached": cached,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
 
-    # XML functions to retrieve xml repice parameters (if multiple recipes are stored in one xml file, id could be used)
-    def getSteps(self, id, recipe_type):
-        steps = []
-        if recipe_type == "xml":
-            e = xml.etree.ElementTree.parse(self.path).getroot()
-            for e in e.findall("./RECIPE[%s]/MASH/MASH_STEPS/MASH_STEP" % (str(id))):
-                if self.cbpi.config.get("TEMP_UNIT", "C") == "C":
-                    temp = float(e.find("STEP_TEMP").text)
-                else:
-                    temp = round(9.0 / 5.0 * float(e.find("STEP_TEMP").text) + 32, 2)
-                steps.append(
-                    {
-                        "name": e.find("NAME").text,
-                        "temp": temp,
-                        "timer": float(e.find("STEP_TIME").text),
-                    }
-                )
-        elif recipe_type == "json":
-            self.path = self.cbpi.config_folder.get_upload_file("mmum.json")
-            e = json.load(open(self.path))
-            for idx in range(1, self.findMax("Infusion_Rastzeit%%")):
-                if self.cbpi.config.get("TEMP_UNIT", "C") == "C":
-                    temp = float(e["Infusion_Rasttemperatur{}".format(idx)])
-                else:
-                    temp = round(
-                        9.0 / 5.0 * float(e["Infusion_Rasttemperatur{}".format(idx)])
-                        + 32,
-                        2,
-                    )
-
-                steps.append(
-                    {
-                        "name": "Rast {}".format(idx),
-                        "temp": temp,
-                        "timer": float(e["Infusion_Rastzeit{}".format(idx)]),
-                    }
-                )
-
-        return steps
-
-    async def bf_recipe_creation(self, Recipe_ID):
-        config = self.get_config_values()
-
-        if self.kettle is not None:
-
-            brewfather = True
-            result = []
-            self.bf_url = "https://api.brewfather.app/v2/recipes/" + Recipe_ID
-            brewfather_user_id = self.cbpi.config.get("brewfather_user_id", None)
-            if brewfather_user_id == "" or brewfather_user_id is None:
-                brewfather = False
-
-            brewfather_api_key = self.cbpi.config.get("brewfather_api_key", None)
-            if brewfather_api_key == "" or brewfather_api_key is None:
-                brewfather = False
-
-            if brewfather == True:
-                encodedData = base64.b64encode(
-                    bytes(f"{brewfather_user_id}:{brewfather_api_key}", "ISO-8859-1")
-                ).decode("ascii")
-                headers = {"Authorization": "Basic %s" % encodedData}
-                bf_recipe = ""
-
-                async with aiohttp.ClientSession(headers=headers) as bf_session:
-                    async with bf_session.get(self.bf_url) as r:
-                        bf_recipe = await r.json()
-                    await bf_session.close()
-
-            if bf_recipe != "":
-                try:
-                    StrikeTemp = bf_recipe["data"]["strikeTemp"]
-                except:
-                    StrikeTemp = None
-                # BF is sending all Temeprature values in °C. If system is running in F, values need to be converted
-                if StrikeTemp is not None and self.TEMP_UNIT != "C":
-                    StrikeTemp = round((9.0 / 5.0 * float(StrikeTemp) + 32))
-
-                RecipeName = bf_recipe["name"]
-                BoilTime = bf_recipe["boilTime"]
-                mash_steps = bf_recipe["mash"]["steps"]
-                hops = bf_recipe["hops"]
-                try:
-                    miscs = bf_recipe["miscs"]
-                except:
-                    miscs = None
-
-                try:
-                    fermentation_steps = bf_recipe["fermentation"]["steps"]
-                except:
-                    fermentation_steps = None
-
-                if fermentation_steps is not None:
-                    try:
-                        step = fermentation_steps[0]
-                        self.fermentation_step_temp = int(step["stepTemp"])
-                    except:
-                        self.fermentation_step_temp = None
-
-                if self.fermentation_step_temp is not None and self.TEMP_UNIT != "C":
-                    self.fermentation_step_temp = round(
-                        (9.0 / 5.0 * float(self.fermentation_step_temp) + 32)
+    # returns the steps of a recipe and if they were taken from the plan cache.
+    # The cache key contains the content hash of the source, the recipe id and the settings that change the steps.
+    # Parsing and conversion is skipped for a recipe that has been imported before with the same settings
+    # Profiled imports are always parsed, in the event loop
+    async def load_plan(self, context, job=None):
+        source = context.source
+        run = self.run_inline if context.profiling else self.parse
+        bf_recipe = None
+        if source == "bf":
+            bf_recipe = await self.load_bf_recipe(context.recipe_id)
+            digest = hashlib.sha1(bf_recipe).hexdigest()
+        else:
+            path = await self.source_path(source)
+            # FileHashes holds a lock and can't be sent to a process executor -> hashing runs in a thread
+            digest = await asyncio.to_thread(self.file_hashes.get, path)
+        key = (source, str(context.recipe_id), digest, settings_key(context.config))
+        plan = None if context.profiling else self.plans.get(key)
+        if plan is not None:
+            self.metrics.cache.inc("plans", "hit")
+            return plan, True
+        self.metrics.cache.inc("plans", "miss")
+
+        with self.metrics.parse.time(source):
+            if bf_recipe is not None:
+                recipe = await run(brewfather.loads, bf_recipe)
+            else:
+                recipe = await self.load_recipe(source, context.recipe_id, run, path)
+        if job is not None:
+            job.update(phase="plan")
+        with self.metrics.plan.time(source):
+            steps = StepPlanBuilder(context.config).build(recipe)
+        plan = Plan(recipe.name, steps, tuple(recipe.warnings))
+        self.plans.put(key, plan)
+        return plan, False
+
+    # downloaded content (bytes) of a brewfather recipe
+    async def load_bf_recipe(self, Recipe_ID):
+        client = self.brewfather_client()
+        if client is None:
+            raise ValueError(
+                "Please specify brewfather_user_id and brewfather_api_key in settings"
+            )
+        # recipes from the catalog are already downloaded and up to date
+        bf_recipe = self.bf_catalog.get(Recipe_ID)
+        if bf_recipe is not None:
+            self.metrics.cache.inc("bf_catalog", "hit")
+            return bf_recipe
+        self.metrics.cache.inc("bf_catalog", "miss")
+        with self.metrics.bf_fetch.time():
+            return await client.recipe(Recipe_ID)
+
+    # reads a recipe from one of the file sources (kbh, xml, json) and returns it as Recipe. Brewfather recipes are
+    # loaded by load_plan. run: runs the parser (default: executor)
+    async def load_recipe(self, source, Recipe_ID, run=None, path=None):
+        run = run or self.parse
+        if path is None:
+            path = await self.source_path(source)
+        if source == "kbh":
+            return await run(lazy_module("kbh").parse, path, Recipe_ID)
+        if source == "xml":
+            return await run(lazy_module("beerxml").parse, path, Recipe_ID)
+        return await run(mmum.parse, path)
+
+    # file of a source: last upload via /creation/upload or the file of the cbpi upload (kbh.db, beer.xml, mmum.json)
+    async def source_path(self, source):
+        upload_file = self.cbpi.config_folder.get_upload_file(SOURCES[source][1])
+        return await asyncio.to_thread(self.uploads.select, source, upload_file)
+
+    # drops the caches of a file that is no longer used
+    def release_file(self, path):
+        self.file_hashes.invalidate(path)
+        mmum.documents.invalidate(path)
+        kbh = loaded_module("kbh")
+        if kbh is not None:
+            kbh.close(path)
+        beerxml = loaded_module("beerxml")
+        if beerxml is not None:
+            with beerxml.indexes_lock:
+                beerxml.indexes.pop(os.path.abspath(path), None)
+
+    # search index of a source, rebuilt in the executor if the source has changed. None if the source is not available
+    async def search_index(self, source):
+        async with self.search.lock(source):
+            if source == "bf":
+                catalog = self.bf_catalog
+                key = (catalog.updated, len(catalog.summaries), len(catalog.bodies))
+                index = self.search.get(source, key)
+                if index is None:
+                    if not catalog.summaries:
+                        return None
+                    recipes = [
+                        (recipe_id, summary, catalog.bodies.get(recipe_id))
+                        for recipe_id, summary in catalog.summaries.items()
+                    ]
+                    index = await self.parse(build_bf_index, recipes)
+                    self.search.put(source, key, index)
+                return index
+
+            path = await self.source_path(source)
+            try:
+                key = await asyncio.to_thread(self.file_hashes.get, path)
+                index = self.search.get(source, key)
+                if index is None:
+                    index = await self.parse(build_index, source, path)
+                    self.search.put(source, key, index)
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.warning("No search index for %s: %s" % (source, e))
+                return None
+            return index
+
+    # ids of all recipes of a source
+    async def recipe_ids(self, source):
+        if source == "bf":
+            if not self.bf_catalog.summaries:
+                client = self.brewfather_client()
+                if client is None:
+                    raise ValueError(
+                        "Please specify brewfather_user_id and brewfather_api_key in settings"
                     )
-
-                FirstWort = self.getFirstWort(hops, "bf")
-
-                await self.create_recipe(RecipeName)
-
-                # Mash Steps -> first step is different as it heats up to defined temp and stops with notification to add malt
-                # AutoMode is yes to start and stop automatic mode or each step
-                MashIn_Flag = True
-                step_kettle = self.id
-                for step in mash_steps:
-                    try:
-                        step_name = step["name"]
-                        if step_name == "":
-                            step_name = "MashStep"
-                    except:
-                        step_name = "MashStep"
-
-                    step_timer = str(int(step["stepTime"]))
-
-                    if self.TEMP_UNIT == "C":
-                        step_temp = str(int(step["stepTemp"]))
-                    else:
-                        step_temp = str(round((9.0 / 5.0 * int(step["stepTemp"]) + 32)))
-
-                    sensor = self.kettle.sensor
-                    if MashIn_Flag == True:
-
-                        if int(step_timer) == 0:
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-
-                        elif self.addmashin == "Yes":
-                            mashin_temp = (
-                                str(round(StrikeTemp))
-                                if StrikeTemp is not None
-                                else step_temp
-                            )
-                            step_type = (
-                                self.mashin if self.mashin != "" else "MashInStep"
-                            )
-                            Notification = (
-                                "Target temperature reached. Please add malt."
-                            )
-                            MashIn_Flag = False
-                            step_string = {
-                                "name": "MashIn",
-                                "props": {
-                                    "AutoMode": self.AutoMode,
-                                    "Kettle": self.id,
-                                    "Sensor": self.kettle.sensor,
-                                    "Temp": mashin_temp,
-                                    "Timer": 0,
-                                    "Notification": Notification,
-                                },
-                                "status_text": "",
-                                "status": "I",
-                                "type": step_type,
-                            }
-                            await self.create_step(step_string)
-
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-                        else:
-                            step_type = self.mash if self.mash != "" else "MashStep"
-                            Notification = ""
-
-                    else:
-                        step_type = self.mash if self.mash != "" else "MashStep"
-                        Notification = ""
-
-                    step_string = {
-                        "name": step_name,
-                        "props": {
-                            "AutoMode": self.AutoMode,
-                            "Kettle": self.id,
-                            "Sensor": self.kettle.sensor,
-                            "Temp": step_temp,
-                            "Timer": step_timer,
-                            "Notification": Notification,
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": step_type,
-                    }
-
-                    await self.create_step(step_string)
-
-                # MashOut -> Simple step that sends notification and waits for user input to move to next step (AutoNext=No)
-
-                if self.mashout == "NotificationStep":
-                    step_string = {
-                        "name": "Lautering",
-                        "props": {
-                            "AutoNext": "No",
-                            "Kettle": self.id,
-                            "Notification": "Mash Process completed. Please start lautering and press next to start boil.",
-                        },
-                        "status_text": "",
-                        "status": "I",
-                        "type": self.mashout,
-                    }
-                await self.create_step(step_string)
-
-                # Boil step including hop alarms and alarm for first wort hops -> Automode is set tu yes
-                Hops = self.getBoilAlerts(hops, miscs, "bf")
-
-                step_kettle = self.boilid
-                step_time = str(int(BoilTime))
-                step_type = self.boil if self.boil != "" else "BoilStep"
-                step_temp = self.BoilTemp
-                sensor = self.boilkettle.sensor
-                LidAlert = "Yes"
-
-                step_string = {
-                    "name": "Boil Step",
-                    "props": {
-                        "AutoMode": self.AutoMode,
-                        "Kettle": step_kettle,
-                        "Sensor": sensor,
-                        "Temp": step_temp,
-                        "Timer": step_time,
-                        "First_Wort": FirstWort[0],
-                        "First_Wort_text": FirstWort[1],
-                        "LidAlert": LidAlert,
-                        "Hop_1": Hops[0][0],
-                        "Hop_1_text": Hops[0][1],
-                        "Hop_2": Hops[1][0],
-                        "Hop_2_text": Hops[1][1],
-                        "Hop_3": Hops[2][0],
-                        "Hop_3_text": Hops[2][1],
-                        "Hop_4": Hops[3][0],
-                        "Hop_4_text": Hops[3][1],
-                        "Hop_5": Hops[4][0],
-                        "Hop_5_text": Hops[4][1],
-                        "Hop_6": Hops[5][0],
-                        "Hop_6_text": Hops[5][1],
-                    },
-                    "status_text": "",
-                    "status": "I",
-                    "type": step_type,
-                }
-
-                await self.create_step(step_string)
-
-                await self.create_Whirlpool_Cooldown()
-
-                self.cbpi.notify(
-                    "Brewfather App Recipe created: ", RecipeName, NotificationType.INFO
-                )
+                return [summary["_id"] for summary in await client.recipes()]
+            return list(self.bf_catalog.summaries)
+
+        path = await self.source_path(source)
+        if source == "kbh":
+            return await self.parse(lazy_module("kbh").recipe_ids, path)
+        if source == "xml":
+            return await self.parse(lazy_module("beerxml").recipe_ids, path)
+        return [1]
+
+    # starts the import of a recipe into the mash profile. Returns 202 and the job id, progress at /creation/jobs/<id>
+    async def start_job(self, source, Recipe_ID, profiling=False):
+        config = self.settings.get()
+        if config["kettle"] is None:
+            self.no_kettle()
+            return web.json_response(
+                {"error": "No default Kettle defined"}, status=400
+            )
+        context = ImportContext.create(source, Recipe_ID, config, profiling=profiling)
+        job = await self.get_queue().submit(context)
+        job.future.add_done_callback(lambda future: self.job_finished(job))
+        return web.json_response({"id": job.id}, status=202)
+
+    # notification when an import into the mash profile is finished
+    def job_finished(self, job):
+        label, filename, message = SOURCES[job.context.source]
+        if not job.future.cancelled():
+            # mark the exception as retrieved, it is reported below
+            job.future.exception()
+        if job.status == "done":
+            for warning in job.result["warnings"]:
+                self.cbpi.notify("Recipe Import", warning, NotificationType.WARNING)
+            self.cbpi.notify(
+                "{} Recipe created".format(label),
+                job.result["name"],
+                NotificationType.INFO,
+            )
+            logger.info("%s import took %.1f ms" % (label, job.result["ms"]))
+        elif job.status == "cancelled":
+            self.cbpi.notify(
+                "{} Recipe creation cancelled".format(label),
+                str(job.context.recipe_id),
+                NotificationType.WARNING,
+            )
+        elif isinstance(job.error, FileNotFoundError):
+            self.cbpi.notify("File Not Found", message, NotificationType.ERROR)
         else:
             self.cbpi.notify(
-                "Recipe Upload",
-                "No default Kettle defined. Please specify default Kettle in settings",
+                "{} Recipe creation failure: {}".format(label, job.error),
+                str(job.context.recipe_id),
                 NotificationType.ERROR,
             )
+            logger.error(job.error)
+
+    # converts recipes of a source and writes them to the recipe book (without brewing them)
+    async def batch_import(self, source, ids):
+        config = self.settings.get()
+        if config["kettle"] is None:
+            raise ValueError(
+                "No default Kettle defined. Please specify default Kettle in settings"
+            )
+        progress = {
+            "source": source,
+            "total": len(ids),
+            "done": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "results": [],
+        }
+        self.batch_progress = progress
+        start = time.perf_counter()
 
-    def getBoilAlerts(self, hops, miscs, recipe_type):
-        alerts = []
-        for hop in hops:
-            if recipe_type == "xml":
-                use = hop.find("USE").text
-                ## Hops which are not used in the boil step should not cause alerts
-                if use != "Aroma" and use != "Boil":
-                    continue
-                alerts.append([float(hop.find("TIME").text), hop.find("NAME").text])
-            elif recipe_type == "bf":
-                use = hop["use"]
-                if use != "Aroma" and use != "Boil":
-                    continue
-                alerts.append([float(hop["time"]), hop["name"]])  ## TODO: Testing
-            elif recipe_type == "kbh":
-                alerts.append([float(hop[0]), hop[1]])
-            elif recipe_type == "json":
-                alerts.append([float(hop["time"]), hop["name"]])
-
-        ## There might also be miscelaneous additions during boild time
-        if miscs is not None:
-            for misc in miscs:
-                if recipe_type == "xml":
-                    alerts.append(
-                        [float(misc.find("TIME").text), misc.find("NAME").text]
-                    )
-                elif recipe_type == "bf":
-                    use = misc["use"]
-                    if use != "Aroma" and use != "Boil":
-                        continue
-                    alerts.append([float(misc["time"]), misc["name"]])  ## TODO: Testing
-                elif recipe_type == "kbh":
-                    alerts.append([float(misc[0]), misc[1]])
-                elif recipe_type == "json":
-                    alerts.append([float(misc["time"]), misc["name"]])
-        ## Dedupe and order the additions by their time
-        ## CBP should have these additions in reverse
-        alerts = sorted(alerts, key=lambda x: x[0], reverse=True)
-        hop_alerts = [
-            [None, None],
-            [None, None],
-            [None, None],
-            [None, None],
-            [None, None],
-            [None, None],
-        ]
-        for i in range(0, 6):
+        async def convert(Recipe_ID):
+            context = ImportContext.create(source, Recipe_ID, config, "book")
+            job = None
             try:
-                if float(alerts[i][0]) > -1:
-                    hop_alerts[i] = alerts[i]
-            except:
-                pass
-        return hop_alerts
-
-    def getFirstWort(self, hops, recipe_type):
-        alert = "No"
-        names = []
-        if recipe_type == "kbh":
-            if len(hops) != 0:
-                alert = "Yes"
-                for hop in hops:
-                    names.append(hop[1])
-        elif recipe_type == "xml":
-            for hop in hops:
-                use = hop.find("USE").text
-                ## Hops which are not used in the boil step should not cause alerts
-                if use != "First Wort":
-                    continue
-                alert = "Yes"
-                names.append(hop.find("NAME").text)
-        elif recipe_type == "bf":
-            for hop in hops:
-                if hop["use"] == "First Wort":
-                    alert = "Yes"
-                    names.append(hop["name"])  ## TODO: Testing
-        elif recipe_type == "json":
-            if len(hops) != 0:
-                alert = "Yes"
-                for hop in hops:
-                    names.append(hop["name"])
-
-        return [alert, " and ".join(names)]
-
-    async def create_Whirlpool_Cooldown(self, time: str = "15"):
-        # Add Waitstep as Whirlpool
-        if self.cooldown != "WaiStep" and self.cooldown != "":
-            step_string = {
-                "name": "Whirlpool",
-                "props": {"Kettle": self.boilid, "Timer": time},
-                "status_text": "",
-                "status": "I",
-                "type": "WaitStep",
-            }
-            await self.create_step(step_string)
-
-        # CoolDown step is sending a notification when cooldowntemp is reached
-        step_type = self.cooldown if self.cooldown != "" else "WaitStep"
-        step_name = "CoolDown"
-        cooldown_sensor = ""
-        step_temp = ""
-        step_timer = time
-        if step_type.find("Cooldown") != -1:
-            cooldown_sensor = self.cbpi.config.get("steps_cooldown_sensor", None)
-            if cooldown_sensor is None or cooldown_sensor == "":
-                cooldown_sensor = (
-                    self.boilkettle.sensor
-                )  # fall back to boilkettle sensor if no other sensor is specified
-            step_timer = ""
-            try:
-                step_temp = (
-                    int(self.CoolDownTemp)
-                    if (
-                        self.fermentation_step_temp is None
-                        or self.fermentation_step_temp <= int(self.CoolDownTemp)
-                    )
-                    else self.fermentation_step_temp
-                )
-            except:
-                step_temp = int(self.CoolDownTemp)
-            step_string = {
-                "name": "Cooldown",
-                "props": {
-                    "Kettle": self.boilid,
-                    "Timer": step_timer,
-                    "Temp": step_temp,
-                    "Sensor": cooldown_sensor,
-                    "Actor": self.CoolDownActor,
-                },
-                "status_text": "",
-                "status": "I",
-                "type": step_type,
-            }
-            await self.create_step(step_string)
+                job = await self.get_queue().submit(context)
+                # shield: only a cancelled job (DELETE /creation/jobs/<id>) ends up here as cancelled,
+                # a cancellation of the batch request itself is raised
+                result = dict(await asyncio.shield(job.future))
+                del result["warnings"]
+            except asyncio.CancelledError:
+                if job is None or not job.future.cancelled():
+                    raise
+                progress["cancelled"] += 1
+                result = {"id": Recipe_ID, "status": "cancelled"}
+            except Exception as e:
+                progress["failed"] += 1
+                result = {"id": Recipe_ID, "error": str(e)}
+            progress["done"] += 1
+            progress["results"].append(result)
+
+        await asyncio.gather(*[convert(Recipe_ID) for Recipe_ID in ids])
+        duration = time.perf_counter() - start
+        progress["duration"] = round(duration, 3)
+        progress["recipes_per_second"] = (
+            round(progress["done"] / duration, 1) if duration > 0 else None
+        )
+        self.cbpi.notify(
+            "{} Batch Import".format(SOURCES[source][0]),
+            "{} of {} recipes added to the recipe book".format(
+                progress["done"] - progress["failed"] - progress["cancelled"],
+                progress["total"],
+            ),
+            NotificationType.INFO,
+        )
+        return progress
+
+    def brewfather_client(self):
+        brewfather_user_id = self.cbpi.config.get("brewfather_user_id", None)
+        brewfather_api_key = self.cbpi.config.get("brewfather_api_key", None)
+        if not brewfather_user_id or not brewfather_api_key:
+            return None
+        return brewfather.Client(
+            self.get_session,
+            self.cbpi.config_folder.get_file_path("brewfather"),
+            brewfather_user_id,
+            brewfather_api_key,
+            ttl=float(self.cbpi.config.get("recipe_import_bf_cache_ttl", 3600)),
+        )
+
+    # background job that keeps the brewfather catalog up to date
+    async def bf_catalog_job(self):
+        await asyncio.to_thread(self.bf_catalog.load)
+        while True:
+            interval = float(self.cbpi.config.get("recipe_import_bf_catalog_interval", 60))
+            if interval <= 0:
+                return
+            client = self.brewfather_client()
+            if client is not None:
+                try:
+                    await self.bf_catalog.refresh(client)
+                except Exception as e:
+                    logger.warning("Brewfather catalog update failed: {}".format(e))
+            await asyncio.sleep(interval * 60)
+
+    def resolve_config(self):
+        with self.metrics.config.time():
+            return self.get_config_values()
 
     def get_config_values(self):
-        self.kettle = None
-        self.boilkettle = None
-        # Define MashSteps
-        self.TEMP_UNIT = self.cbpi.config.get("TEMP_UNIT", "C")
-        self.AutoMode = self.cbpi.config.get("AutoMode", "Yes")
-        self.mashin = self.cbpi.config.get("steps_mashin", "MashInStep")
-        self.mash = self.cbpi.config.get("steps_mash", "MashStep")
-        self.mashout = self.cbpi.config.get(
-            "steps_mashout", None
-        )  # Currently used only for the Braumeister
-        self.boil = self.cbpi.config.get("steps_boil", "BoilStep")
-        self.whirlpool = "Waitstep"
-        self.cooldown = self.cbpi.config.get("steps_cooldown", "WaitStep")
-        # get default boil temp from settings
-        self.BoilTemp = self.cbpi.config.get("steps_boil_temp", 98)
-        # get default cooldown temp alarm setting
-        self.CoolDownTemp = self.cbpi.config.get("steps_cooldown_temp", 25)
-        self.CoolDownActor = self.cbpi.config.get("steps_cooldown_actor", None)
+        kettle = None
+        boilkettle = None
         # get default Kettle from Settings
-        self.id = self.cbpi.config.get("MASH_TUN", None)
-        self.boilid = self.cbpi.config.get("BoilKettle", None)
-        if self.boilid is None:
-            self.boilid = self.id
-        # If next parameter is Yes, MashIn Ste will be added before first mash step if not included in recipe
-        self.addmashin = self.cbpi.config.get("AddMashInStep", "Yes")
-
+        kettle_id = self.cbpi.config.get("MASH_TUN", None)
+        boilkettle_id = self.cbpi.config.get("BoilKettle", None)
+        if boilkettle_id is None:
+            boilkettle_id = kettle_id
         try:
-            self.kettle = self.cbpi.kettle.find_by_id(self.id)
+            kettle = self.cbpi.kettle.find_by_id(kettle_id)
         except:
-            self.cbpi.notify(
-                "Recipe Upload",
-                "No default Kettle defined. Please specify default Kettle in settings",
-                NotificationType.ERROR,
-            )
+            kettle = None
         try:
-            self.boilkettle = self.cbpi.kettle.find_by_id(self.boilid)
+            boilkettle = self.cbpi.kettle.find_by_id(boilkettle_id)
         except:
-            self.boilkettle = self.kettle
+            boilkettle = kettle
 
         config_values = {
-            "kettle": self.kettle,
-            "kettle_id": str(self.id),
-            "boilkettle": self.boilkettle,
-            "boilkettle_id": str(self.boilid),
-            "mashin": str(self.mashin),
-            "mash": str(self.mash),
-            "mashout": str(self.mashout),
-            "boil": str(self.boil),
-            "whirlpool": str(self.whirlpool),
-            "cooldown": str(self.cooldown),
-            "boiltemp": str(self.BoilTemp),
-            "cooldowntemp": str(self.CoolDownTemp),
-            "cooldownactor": self.CoolDownActor,
-            "temp_unit": str(self.TEMP_UNIT),
-            "AutoMode": str(self.AutoMode),
+            "kettle": kettle,
+            "kettle_id": str(kettle_id),
+            "boilkettle": boilkettle,
+            "boilkettle_id": str(boilkettle_id),
+            # Define MashSteps
+            "mashin": str(self.cbpi.config.get("steps_mashin", "MashInStep")),
+            "mash": str(self.cbpi.config.get("steps_mash", "MashStep")),
+            # Currently used only for the Braumeister
+            "mashout": str(self.cbpi.config.get("steps_mashout", None)),
+            "boil": str(self.cbpi.config.get("steps_boil", "BoilStep")),
+            "whirlpool": "Waitstep",
+            "cooldown": str(self.cbpi.config.get("steps_cooldown", "WaitStep")),
+            # get default boil temp from settings
+            "boiltemp": str(self.cbpi.config.get("steps_boil_temp", 98)),
+            # get default cooldown temp alarm setting
+            "cooldowntemp": str(self.cbpi.config.get("steps_cooldown_temp", 25)),
+            "cooldownactor": self.cbpi.config.get("steps_cooldown_actor", None),
+            "temp_unit": str(self.cbpi.config.get("TEMP_UNIT", "C")),
+            "AutoMode": str(self.cbpi.config.get("AutoMode", "Yes")),
+            # If next parameter is Yes, MashIn Ste will be added before first mash step if not included in recipe
+            "addmashin": str(self.cbpi.config.get("AddMashInStep", "Yes")),
+            "cooldownsensor": self.cbpi.config.get("steps_cooldown_sensor", None),
+            # number of hop alerts of the boil step. More alerts are moved to additional boil steps
+            "boil_alerts": int(self.cbpi.config.get("recipe_import_boil_alerts", 6)),
         }
-        logging.info(config_values)
         return config_values
 
+    # writes a recipe with all steps to the recipe book
+    async def save_recipe(self, name, steps):
+        recipe_id = await self.cbpi.recipe.create(name)
+        data = {
+            "basic": {
+                "name": name,
+                "author": self.cbpi.config.get("AUTHOR", "John Doe"),
+            },
+            "steps": [dict(step, id=shortuuid.uuid()) for step in steps],
+        }
+        await self.cbpi.recipe.save(recipe_id, data)
+        return recipe_id
+
     async def create_recipe(self, name):
         # Create recipe in recipe Book with name of first recipe in xml file
-        self.recipeID = await self.cbpi.recipe.create(name)
+        recipe_id = await self.cbpi.recipe.create(name)
         # send recipe to mash profile
-        await self.cbpi.recipe.brew(self.recipeID)
+        await self.cbpi.recipe.brew(recipe_id)
         # remove empty recipe from recipe book
-        await self.cbpi.recipe.remove(self.recipeID)
+        await self.cbpi.recipe.remove(recipe_id)
+
+    # adds all steps of the import to the mash profile
+    async def write_steps(self, steps, job=None):
+        controller = getattr(self.cbpi, "step", None)
+        if all(hasattr(controller, attr) for attr in ("create", "profile", "save")):
+            # add all steps directly to the step controller -> profile is saved and pushed to the ui only once
+            items = [
+                controller.create(dict(step_string, id=shortuuid.uuid()))
+                for step_string in steps
+            ]
+            controller.profile.extend(items)
+            await controller.save()
+        else:
+            # fallback for cbpi versions without step controller api
+            for step_string in steps:
+                await self.post_step(step_string)
+                if job is not None:
+                    job.update(steps_done=job.steps_done + 1)
 
     # function to create json to be send to api to add a step to the current mash profile. Currently all properties are send to each step which does not cuase an issue
-    async def create_step(self, step_string):
+    async def post_step(self, step_string):
         # get server port from settings and define url for api calls -> adding steps
-        self.port = str(self.cbpi.static_config.get("port", 8000))
-        self.url = "http://127.0.0.1:" + self.port + "/step2/"
+        port = str(self.cbpi.static_config.get("port", 8000))
+        url = "http://127.0.0.1:" + port + "/step2/"
         # convert step:string to json required for api call.
         step = json.dumps(step_string)
         headers = {"Content-Type": "application/json", "Accept": "application/json"}
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(self.url, data=step) as response:
+        with self.metrics.step_post.time():
+            async with self.get_session().post(
+                url, data=step, headers=headers
+            ) as response:
                 return await response.text()
-            await self.push_update()
 
 
 def setup(cbpi):
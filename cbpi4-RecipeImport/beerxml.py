@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# Parser for BeerXML files (beer.xml). If multiple recipes are stored in one file, the index selects the recipe (starting with 1)
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import xml.etree.ElementTree
+
+from .recipe import Addition, MashStep, Recipe
+
+logger = logging.getLogger(__name__)
+
+RECIPE_TAG = re.compile(rb"<(/?)RECIPE(?=[\s>/])")
+ENCODING = re.compile(rb"<\?xml[^>]*encoding=[\"']([A-Za-z0-9._-]+)[\"']")
+
+
+def parse(path, Recipe_ID):
+    # use the byte offset index of the file to parse only the requested recipe.
+    # Fall back to streaming the file if no index can be created (e.g. unsupported encoding)
+    try:
+        index = get_index(path)
+    except Exception as e:
+        logger.warning("No recipe index for %s: %s" % (path, e))
+        return parse_stream(path, Recipe_ID)
+    return index.parse(Recipe_ID)
+
+
+def recipe_ids(path):
+    return list(range(1, len(get_index(path).recipes) + 1))
+
+
+def list_recipes(path, after, limit):
+    return get_index(path).list(after, limit)
+
+
+def search_documents(path):
+    # name, style, hops and miscs of all recipes for the search index. The file is streamed, recipes are removed after reading
+    documents = []
+    depth = 0
+    root = None
+    with open(path, "rb") as f:
+        for event, element in xml.etree.ElementTree.iterparse(
+            f, events=("start", "end")
+        ):
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and element.tag == "RECIPE":
+                documents.append(
+                    {
+                        "id": len(documents) + 1,
+                        "name": element.findtext("NAME") or "",
+                        "style": element.findtext("STYLE/NAME") or "",
+                        "hops": [h.text for h in element.findall("HOPS/HOP/NAME") if h.text],
+                        "miscs": [m.text for m in element.findall("MISCS/MISC/NAME") if m.text],
+                    }
+                )
+                root.clear()
+    return documents
+
+
+def parse_stream(path, Recipe_ID):
+    # stream through the file until the requested RECIPE element is complete.
+    # Recipes before the requested one are removed from the tree as soon as they are read and the rest of the file is not read at all
+    index = int(Recipe_ID)
+    count = 0
+    depth = 0
+    root = None
+    with open(path, "rb") as f:
+        for event, element in xml.etree.ElementTree.iterparse(
+            f, events=("start", "end")
+        ):
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and element.tag == "RECIPE":
+                count += 1
+                if count == index:
+                    return parse_recipe(element)
+                root.clear()
+    raise ValueError("Recipe {} not found".format(Recipe_ID))
+
+
+def parse_recipe(element):
+    recipe = Recipe(element.find("NAME").text, float(element.find("BOIL_TIME").text))
+    recipe.truncate_fahrenheit = True
+    for step in element.findall("./MASH/MASH_STEPS/MASH_STEP"):
+        recipe.mash_steps.append(
+            MashStep(
+                step.find("NAME").text,
+                float(step.find("STEP_TEMP").text),
+                float(step.find("STEP_TIME").text),
+            )
+        )
+    for hop in element.findall("./HOPS/HOP"):
+        use = hop.find("USE").text
+        ## Hops which are not used in the boil step should not cause alerts
+        if use == "Aroma" or use == "Boil":
+            recipe.hops.append(
+                Addition(hop.find("NAME").text, float(hop.find("TIME").text))
+            )
+        elif use == "First Wort":
+            recipe.first_wort.append(hop.find("NAME").text)
+    ## There might also be miscelaneous additions during boild time
+    for misc in element.findall('MISCS/MISC[USE="Boil"]'):
+        recipe.miscs.append(
+            Addition(misc.find("NAME").text, float(misc.find("TIME").text))
+        )
+    return recipe
+
+
+# Index of all RECIPE elements of a file with byte range, name, style and boil time.
+# The index is stored next to the file (<file>.index.json) and is rebuilt if the content of the file changes
+class RecipeIndex:
+    VERSION = 2
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".index.json"
+        self.stat = None
+        self.digest = None
+        self.encoding = "utf-8"
+        self.recipes = []
+
+    def valid(self, stat):
+        return self.stat == [stat.st_mtime_ns, stat.st_size]
+
+    def update(self):
+        stat = os.stat(self.path)
+        if self.valid(stat):
+            return
+        if self.stat is None and self.load(stat):
+            return
+        with open(self.path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        if digest != self.digest:
+            self.build(content)
+            self.digest = digest
+        self.stat = [stat.st_mtime_ns, stat.st_size]
+        self.save()
+
+    def load(self, stat):
+        # read index from disk. If only mtime differs, the content hash decides if the index can be used
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.VERSION:
+            return False
+        self.digest = data["sha1"]
+        self.encoding = data["encoding"]
+        self.recipes = data["recipes"]
+        if data["stat"] == [stat.st_mtime_ns, stat.st_size]:
+            self.stat = data["stat"]
+            return True
+        return False
+
+    def save(self):
+        data = {
+            "version": self.VERSION,
+            "stat": self.stat,
+            "sha1": self.digest,
+            "encoding": self.encoding,
+            "recipes": self.recipes,
+        }
+        try:
+            with open(self.index_path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+        except OSError as e:
+            logger.warning("Unable to write recipe index %s: %s" % (self.index_path, e))
+
+    def build(self, content):
+        match = ENCODING.search(content, 0, 200)
+        self.encoding = match.group(1).decode("ascii") if match else "utf-8"
+        recipes = []
+        start = None
+        depth = 0
+        for match in RECIPE_TAG.finditer(content):
+            end = content.index(b">", match.end()) + 1
+            if match.group(1):
+                depth -= 1
+                if depth == 0 and start is not None:
+                    recipes.append(self.summary(content[start:end], start, end))
+                    start = None
+            elif content[end - 2 : end] == b"/>":
+                # empty recipe. Still counts for the numbering of the recipes
+                if depth == 0:
+                    recipes.append(
+                        self.summary(content[match.start() : end], match.start(), end)
+                    )
+            else:
+                if depth == 0:
+                    start = match.start()
+                depth += 1
+        self.recipes = recipes
+
+    def fragment(self, data):
+        # parse a single RECIPE element. The declaration is required to decode non utf-8 files
+        header = '<?xml version="1.0" encoding="%s"?>' % self.encoding
+        return xml.etree.ElementTree.fromstring(header.encode("ascii") + data)
+
+    def summary(self, data, start, end):
+        element = self.fragment(data)
+        return {
+            "start": start,
+            "end": end,
+            "name": element.findtext("NAME"),
+            "style": element.findtext("STYLE/NAME"),
+            "boil_time": float(element.findtext("BOIL_TIME") or 0),
+            "steps": len(element.findall("MASH/MASH_STEPS/MASH_STEP")),
+        }
+
+    def read(self, Recipe_ID):
+        index = int(Recipe_ID)
+        if index < 1 or index > len(self.recipes):
+            raise ValueError("Recipe {} not found".format(Recipe_ID))
+        entry = self.recipes[index - 1]
+        with open(self.path, "rb") as f:
+            f.seek(entry["start"])
+            return self.fragment(f.read(entry["end"] - entry["start"]))
+
+    def parse(self, Recipe_ID):
+        return parse_recipe(self.read(Recipe_ID))
+
+    def list(self, after, limit):
+        # recipes after the recipe number "after". Returns the recipes and the total number of recipes
+        after = max(0, int(after or 0))
+        modified = self.stat[0] / 1e9
+        return [
+            {
+                "id": after + n + 1,
+                "name": entry["name"],
+                "boil_time": entry["boil_time"],
+                "steps": entry["steps"],
+                "modified": modified,
+            }
+            for n, entry in enumerate(self.recipes[after : after + limit])
+        ], len(self.recipes)
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    path = os.path.abspath(path)
+    with indexes_lock:
+        index = indexes.get(path)
+        if index is None:
+            index = indexes[path] = RecipeIndex(path)
+        index.update()
+    return index
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Client and parser for recipes downloaded from the Brewfather api (https://api.brewfather.app/v2/recipes/<id>)
+# BF is sending all temperature values in °C
+import asyncio
+import base64
+import bisect
+import json
+import logging
+import os
+import re
+import time
+
+import aiohttp
+
+from .recipe import Addition, MashStep, Recipe
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.brewfather.app/v2"
+RECIPE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse(bf_recipe):
+    recipe = Recipe(bf_recipe["name"], float(bf_recipe["boilTime"]))
+    try:
+        recipe.strike_temp = float(bf_recipe["data"]["strikeTemp"])
+    except:
+        recipe.strike_temp = None
+
+    for step in bf_recipe["mash"]["steps"]:
+        step_name = step.get("name") or "MashStep"
+        recipe.mash_steps.append(
+            MashStep(step_name, float(step["stepTemp"]), float(step["stepTime"]))
+        )
+
+    for hop in bf_recipe["hops"]:
+        if hop["use"] == "Aroma" or hop["use"] == "Boil":
+            recipe.hops.append(Addition(hop["name"], float(hop["time"])))
+        elif hop["use"] == "First Wort":
+            recipe.first_wort.append(hop["name"])
+
+    for misc in bf_recipe.get("miscs") or []:
+        if misc["use"] == "Aroma" or misc["use"] == "Boil":
+            recipe.miscs.append(Addition(misc["name"], float(misc["time"])))
+
+    try:
+        recipe.fermentation_temp = int(bf_recipe["fermentation"]["steps"][0]["stepTemp"])
+    except:
+        recipe.fermentation_temp = None
+    return recipe
+
+
+def loads(content):
+    return parse(json.loads(content))
+
+
+def details(body):
+    # boil time and number of mash steps of a downloaded recipe for the recipe list
+    try:
+        bf_recipe = json.loads(body)
+        return bf_recipe.get("boilTime"), len((bf_recipe.get("mash") or {}).get("steps") or [])
+    except ValueError:
+        return None, None
+
+
+def search_document(recipe_id, bf_recipe):
+    # name, style, hops and miscs of a recipe (or of the summary of a recipe) for the search index
+    return {
+        "id": recipe_id,
+        "name": bf_recipe.get("name") or "",
+        "style": (bf_recipe.get("style") or {}).get("name") or "",
+        "hops": [hop.get("name") for hop in bf_recipe.get("hops") or [] if hop.get("name")],
+        "miscs": [misc.get("name") for misc in bf_recipe.get("miscs") or [] if misc.get("name")],
+    }
+
+
+# Brewfather api client with an on disk cache of the recipe responses (<cache_dir>/<id>.json and <id>.meta.json).
+# Cached recipes younger than ttl seconds are used without a request, older ones are revalidated with ETag / Last-Modified.
+# If Brewfather can't be reached, the cached recipe is used.
+# session returns the shared aiohttp session of the plugin
+class Client:
+    def __init__(self, session, cache_dir, user_id, api_key, ttl=3600, url=API_URL):
+        self.session = session
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.url = url
+        encodedData = base64.b64encode(
+            bytes(f"{user_id}:{api_key}", "ISO-8859-1")
+        ).decode("ascii")
+        self.headers = {"Authorization": "Basic %s" % encodedData}
+
+    def cache_file(self, recipe_id, suffix):
+        if not RECIPE_ID.match(recipe_id):
+            raise ValueError("Invalid Brewfather recipe id {}".format(recipe_id))
+        return os.path.join(self.cache_dir, recipe_id + suffix)
+
+    def read_cache(self, recipe_id):
+        try:
+            with open(self.cache_file(recipe_id, ".meta.json")) as f:
+                meta = json.load(f)
+            with open(self.cache_file(recipe_id, ".json"), "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def write_cache(self, recipe_id, meta, body=None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if body is not None:
+            with open(self.cache_file(recipe_id, ".json.tmp"), "wb") as f:
+                f.write(body)
+            os.replace(
+                self.cache_file(recipe_id, ".json.tmp"),
+                self.cache_file(recipe_id, ".json"),
+            )
+        with open(self.cache_file(recipe_id, ".meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    async def recipes(self, limit=50):
+        # summaries of all recipes. Brewfather returns max. 50 recipes per page, next page starts after the last id
+        result = []
+        params = {"limit": limit, "include": "_timestamp_ms"}
+        while True:
+            async with self.session().get(
+                "%s/recipes" % self.url, headers=self.headers, params=params
+            ) as r:
+                r.raise_for_status()
+                page = await r.json()
+            result.extend(page)
+            if len(page) < limit:
+                return result
+            params["start_after"] = page[-1]["_id"]
+
+    async def recipe(self, recipe_id, force=False, offline=True):
+        # returns the raw json response for the recipe. force: revalidate even if the cached recipe is within ttl.
+        # offline: return the cached recipe if Brewfather can't be reached (otherwise the error is raised)
+        self.cache_file(recipe_id, ".json")
+        meta, body = await asyncio.to_thread(self.read_cache, recipe_id)
+        if body is not None and not force and time.time() - meta["fetched"] < self.ttl:
+            return body
+
+        headers = dict(self.headers)
+        if body is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            async with self.session().get(
+                "%s/recipes/%s" % (self.url, recipe_id), headers=headers
+            ) as r:
+                if r.status == 304 and body is not None:
+                    meta["fetched"] = time.time()
+                    await asyncio.to_thread(self.write_cache, recipe_id, meta)
+                    return body
+                r.raise_for_status()
+                new_body = await r.read()
+                meta = {
+                    "fetched": time.time(),
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if body is None or not offline:
+                raise
+            logger.warning(
+                "Brewfather not available (%s). Using cached recipe %s" % (e, recipe_id)
+            )
+            return body
+        await asyncio.to_thread(self.write_cache, recipe_id, meta, new_body)
+        return new_body
+
+
+# Local catalog of all Brewfather recipes (summaries and full recipes) that is filled by a background job.
+# Only recipes with a changed _timestamp_ms are downloaded again. Summaries are stored in <cache_dir>/catalog.json,
+# the recipes themselves are kept in memory and in the cache of the Client
+class Catalog:
+    def __init__(self, cache_dir, concurrency=4):
+        self.path = os.path.join(cache_dir, "catalog.json")
+        self.concurrency = concurrency
+        self.summaries = {}
+        # sorted ids of the summaries for the paginated list
+        self.ids = []
+        self.bodies = {}
+        self.updated = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.summaries = {summary["_id"]: summary for summary in data["recipes"]}
+            self.updated = data["updated"]
+        except (OSError, ValueError, KeyError):
+            self.summaries = {}
+        self.ids = sorted(self.summaries)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"updated": self.updated, "recipes": list(self.summaries.values())}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def get(self, recipe_id):
+        return self.bodies.get(recipe_id)
+
+    def list(self, after, limit):
+        # recipes with an id > after. Boil time and steps are stored in the summary when the recipe is downloaded
+        ids = self.ids
+        start = bisect.bisect_right(ids, after) if after else 0
+        recipes = []
+        for recipe_id in ids[start : start + limit]:
+            summary = self.summaries[recipe_id]
+            recipes.append(
+                {
+                    "id": recipe_id,
+                    "name": summary.get("name"),
+                    "boil_time": summary.get("boil_time"),
+                    "steps": summary.get("steps"),
+                    "modified": summary.get("_timestamp_ms", 0) / 1000,
+                }
+            )
+        return recipes, len(ids)
+
+    async def refresh(self, client):
+        summaries = await client.recipes()
+        queue = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(summary):
+            recipe_id = summary["_id"]
+            known = self.summaries.get(recipe_id)
+            changed = known is None or known.get("_timestamp_ms") != summary.get(
+                "_timestamp_ms"
+            )
+            if not changed and recipe_id in self.bodies:
+                summary["boil_time"] = known.get("boil_time")
+                summary["steps"] = known.get("steps")
+                return
+            async with queue:
+                # a failed download must not look like an up to date recipe -> no offline fallback
+                body = await client.recipe(recipe_id, force=changed, offline=False)
+            summary["boil_time"], summary["steps"] = await asyncio.to_thread(details, body)
+            self.bodies[recipe_id] = body
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *[fetch(summary) for summary in summaries], return_exceptions=True
+        )
+        refreshed = {}
+        for summary, result in zip(summaries, results):
+            recipe_id = summary["_id"]
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Brewfather recipe %s not loaded: %s" % (recipe_id, result)
+                )
+                # the previous summary keeps the recipe marked as changed -> downloaded again by the next refresh.
+                # The outdated body is dropped, until then imports go through the client (ttl, revalidation)
+                self.bodies.pop(recipe_id, None)
+                summary = self.summaries.get(recipe_id, summary)
+            refreshed[recipe_id] = summary
+        self.summaries = refreshed
+        self.ids = sorted(self.summaries)
+        for recipe_id in list(self.bodies):
+            if recipe_id not in self.summaries:
+                del self.bodies[recipe_id]
+        self.updated = time.time()
+        await asyncio.to_thread(self.save)
+        logger.info(
+            "Brewfather catalog: %d recipes in %.1f s"
+            % (len(self.summaries), time.perf_counter() - start)
+        )
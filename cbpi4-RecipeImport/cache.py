@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Caches for parsed recipe sources
+import collections
+import copy
+import hashlib
+import os
+import threading
+
+
+class DocumentCache:
+    # Keeps the parsed content of files. An entry is valid as long as (mtime, size) of the file is unchanged.
+    # If mtime or size changed, the file is read and hashed again. The loader is only called if the content hash differs.
+    def __init__(self, loader):
+        self.loader = loader
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == (stat.st_mtime_ns, stat.st_size):
+                self.hits += 1
+                return entry[2]
+
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[1] == digest:
+                # file was touched or copied again without changes
+                self.hits += 1
+                document = entry[2]
+            else:
+                self.misses += 1
+                document = self.loader(content)
+            self.entries[path] = ((stat.st_mtime_ns, stat.st_size), digest, document)
+        return document
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class FileHashes:
+    # content hash of files. The hash is only calculated again if mtime or size of the file changed
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return self.add(path, digest.hexdigest(), stat)
+
+    def add(self, path, digest, stat=None):
+        # hash is already known (e.g. calculated during the upload)
+        path = os.path.abspath(path)
+        if stat is None:
+            stat = os.stat(path)
+        with self.lock:
+            self.entries[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+        return digest
+
+    def invalidate(self, path):
+        with self.lock:
+            self.entries.pop(os.path.abspath(path), None)
+
+
+class Plan:
+    # generated steps of a recipe
+    __slots__ = ("name", "steps", "warnings")
+
+    def __init__(self, name, steps, warnings):
+        self.name = name
+        self.steps = steps
+        self.warnings = warnings
+
+    def copy_steps(self):
+        # steps are handed to cbpi which may change them -> the cached steps are never handed out
+        return copy.deepcopy(self.steps)
+
+
+class PlanCache:
+    # LRU cache of step plans. Key: source, recipe id, content hash of the source and the relevant settings
+    def __init__(self, size=32):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        plan = self.entries.get(key)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return plan
+
+    def put(self, key, plan):
+        if self.size <= 0:
+            return
+        self.entries[key] = plan
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def settings_key(config):
+    # settings that change the generated steps. Kettle objects are represented by their sensors
+    values = []
+    for key in sorted(config):
+        value = config[key]
+        if key in ("kettle", "boilkettle"):
+            value = getattr(value, "sensor", None)
+        values.append((key, str(value)))
+    return tuple(values)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Runs the blocking recipe parsers (sqlite, xml, json, file io) outside of the event loop
+import asyncio
+import concurrent.futures
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ParseExecutor:
+    # mode: "thread" or "process". Process workers need to import the plugin again and have their own caches.
+    # queue_size limits the number of parse jobs that are waiting or running. Further jobs wait until a slot is free
+    def __init__(self, workers=1, mode="thread", queue_size=8):
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        if mode == "process":
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="RecipeImport"
+            )
+        self.queue = asyncio.Semaphore(max(self.workers, int(queue_size)))
+        logger.info(
+            "Recipe parser: %s pool with %d worker(s)" % (self.mode, self.workers)
+        )
+
+    async def run(self, func, *args):
+        # result (e.g. the Recipe) is returned to the event loop
+        async with self.queue:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.pool, func, *args
+            )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
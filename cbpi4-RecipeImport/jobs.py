@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Import jobs. Every import carries its own ImportContext, nothing of an import is stored on the extension
+import asyncio
+import logging
+import time
+import types
+import uuid
+from typing import Any, Mapping, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class ImportContext(NamedTuple):
+    source: str
+    recipe_id: Any
+    # config values of the plugin at the start of the import (read only)
+    config: Mapping
+    # "profile": brew the recipe (create mash profile), "book": save the recipe in the recipe book, "plan": steps only (dry run)
+    target: str = "profile"
+    # run the import with cProfile and tracemalloc (profiler.py)
+    profiling: bool = False
+
+    @classmethod
+    def create(cls, source, recipe_id, config, target="profile", profiling=False):
+        if not isinstance(config, types.MappingProxyType):
+            config = types.MappingProxyType(dict(config))
+        return cls(source, recipe_id, config, target, bool(profiling))
+
+
+# State of one import. status: queued, running, done, failed, cancelled
+# phase: queued, parse, plan, write, done
+class Job:
+    def __init__(self, context, on_update=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.context = context
+        self.on_update = on_update
+        self.status = "queued"
+        self.phase = "queued"
+        self.steps_total = 0
+        self.steps_done = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.task = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    def update(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        if self.on_update is not None:
+            try:
+                self.on_update(self)
+            except Exception as e:
+                logger.warning("Job update failed: {}".format(e))
+
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        # the mash profile is not left half written -> jobs can't be cancelled while writing
+        if self.done() or self.phase == "write":
+            return False
+        if self.task is not None:
+            self.task.cancel()
+        else:
+            self.finish("cancelled")
+        return True
+
+    def finish(self, status, result=None, error=None):
+        self.update(
+            status=status,
+            phase="done",
+            result=result,
+            error=error,
+            finished=time.time(),
+        )
+        if self.future.done():
+            return
+        if status == "done":
+            self.future.set_result(result)
+        elif status == "cancelled":
+            self.future.cancel()
+        else:
+            self.future.set_exception(error)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "source": self.context.source,
+            "recipe_id": self.context.recipe_id,
+            "target": self.context.target,
+            "status": self.status,
+            "phase": self.phase,
+            "steps_total": self.steps_total,
+            "steps_done": self.steps_done,
+            "result": self.result,
+            "error": str(self.error) if self.error is not None else None,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+# Queue of import jobs that is processed by a fixed number of workers.
+# handler is called with the Job, its result is the result of the job
+class ImportQueue:
+    def __init__(self, handler, workers=4, size=1000, on_update=None, keep=100):
+        self.handler = handler
+        self.on_update = on_update
+        self.keep = keep
+        self.jobs = {}
+        self.queue = asyncio.Queue(size)
+        self.workers = [
+            asyncio.create_task(self.worker()) for _ in range(max(1, int(workers)))
+        ]
+
+    async def submit(self, context):
+        job = Job(context, self.on_update)
+        self.jobs[job.id] = job
+        self.cleanup()
+        await self.queue.put(job)
+        job.update()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cleanup(self):
+        # keep only the last finished jobs
+        finished = [job for job in self.jobs.values() if job.done()]
+        for job in finished[: max(0, len(finished) - self.keep)]:
+            del self.jobs[job.id]
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.done():
+                    continue
+                job.update(status="running")
+                job.task = asyncio.create_task(self.handler(job))
+                try:
+                    await asyncio.wait([job.task])
+                except asyncio.CancelledError:
+                    job.task.cancel()
+                    job.finish("cancelled")
+                    raise
+                if job.task.cancelled():
+                    job.finish("cancelled")
+                elif job.task.exception() is not None:
+                    job.finish("failed", error=job.task.exception())
+                else:
+                    job.finish("done", result=job.task.result())
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
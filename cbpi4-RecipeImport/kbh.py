@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# Parser for Kleiner Brauhelfer V2 databases (kbh.db)
+import bisect
+import os
+import pathlib
+import sqlite3
+import threading
+
+from .recipe import Addition, MashStep, Recipe
+
+
+# Rows of a Sud that are needed for the import, the recipe list and the search index.
+# modified: Sud.Gespeichert (None if the column does not exist -> the entry is always reloaded)
+class SudEntry:
+    __slots__ = ("modified", "name", "boil_time", "style", "mash", "hops", "miscs")
+
+    def __init__(self, modified, name, boil_time, style):
+        self.modified = modified
+        self.name = name
+        self.boil_time = boil_time
+        self.style = style
+        # Maischplan: (Typ, Name, TempWasser, TempRast, DauerRast)
+        self.mash = []
+        # Hopfengaben: (Zeit, Name, Vorderwuerze)
+        self.hops = []
+        # WeitereZutatenGaben: (Zugabedauer, Name, Zeitpunkt)
+        self.miscs = []
+
+
+# Materialized catalog of a kbh database. Only new Sud entries and entries with another Gespeichert timestamp
+# are read again, the others are kept. The file is checked on every access: if inode, mtime or size changed,
+# the entries are compared with the file. Otherwise PRAGMA data_version of the open connection tells whether
+# another connection has written to the file in the meantime.
+class Database:
+    # Sud entries that are read with one query
+    BATCH = 500
+
+    def __init__(self, path, entries=None):
+        self.path = os.path.abspath(path)
+        self.conn = None
+        self.stat = None
+        self.data_version = None
+        # Sud ID -> SudEntry. May be taken over from the catalog of a previous upload of the same database
+        self.entries = dict(entries or {})
+        self.ids = []
+        self.syncs = {"full": 0, "incremental": 0, "unchanged": 0, "loaded": 0, "removed": 0}
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.close()
+        # not immutable, otherwise PRAGMA data_version does not see changes of the file.
+        # No mmap: the file may be overwritten by the upload while the connection is open
+        uri = pathlib.Path(self.path).as_uri() + "?mode=ro"
+        self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.conn.execute("PRAGMA cache_size = -2000")
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.stat = None
+            self.data_version = None
+
+    def columns(self, conn, table):
+        return {row[1] for row in conn.execute("PRAGMA table_info(%s)" % table)}
+
+    def sync(self):
+        # brings the catalog up to date with the file. Called with the lock held
+        stat = os.stat(self.path)
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self.conn is not None and key == self.stat:
+            if self.conn.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+                return
+            conn = self.conn
+        else:
+            # written, overwritten or replaced. The file may have been overwritten with another database that has the
+            # same change counter -> data_version and the page cache of the old connection can't be trusted
+            conn = self.connect()
+        with conn:
+            # one read transaction: the file may be written while the catalog is read
+            conn.execute("BEGIN")
+            self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            self.load(conn)
+        self.stat = key
+
+    def load(self, conn):
+        sud = self.columns(conn, "Sud")
+        modified = "Gespeichert" if "Gespeichert" in sud else "NULL"
+        style = "Kategorie" if "Kategorie" in sud else "''"
+        current = dict(conn.execute("SELECT ID, %s FROM Sud" % modified))
+        changed = [
+            sud_id
+            for sud_id, timestamp in current.items()
+            if timestamp is None
+            or sud_id not in self.entries
+            or self.entries[sud_id].modified != timestamp
+        ]
+        removed = [sud_id for sud_id in self.entries if sud_id not in current]
+        for sud_id in removed:
+            del self.entries[sud_id]
+        if not changed and not removed:
+            self.syncs["unchanged"] += 1
+        elif len(changed) == len(current):
+            self.syncs["full"] += 1
+        else:
+            self.syncs["incremental"] += 1
+        self.syncs["loaded"] += len(changed)
+        self.syncs["removed"] += len(removed)
+
+        for i in range(0, len(changed), self.BATCH):
+            batch = changed[i : i + self.BATCH]
+            where = "IN (%s)" % ",".join("?" * len(batch))
+            loaded = {}
+            for row in conn.execute(
+                "SELECT ID, %s, Sudname, Kochdauer, %s FROM Sud WHERE ID %s"
+                % (modified, style, where),
+                batch,
+            ):
+                loaded[row[0]] = SudEntry(row[1], row[2], row[3], row[4])
+            for sud_id, *row in conn.execute(
+                "SELECT SudID, Typ, Name, TempWasser, TempRast, DauerRast FROM Maischplan WHERE SudID %s ORDER BY ID"
+                % where,
+                batch,
+            ):
+                loaded[sud_id].mash.append(tuple(row))
+            for sud_id, *row in conn.execute(
+                "SELECT SudID, Zeit, Name, Vorderwuerze FROM Hopfengaben WHERE SudID %s ORDER BY ID"
+                % where,
+                batch,
+            ):
+                loaded[sud_id].hops.append(tuple(row))
+            for sud_id, *row in conn.execute(
+                "SELECT SudID, Zugabedauer, Name, Zeitpunkt FROM WeitereZutatenGaben WHERE SudID %s ORDER BY ID"
+                % where,
+                batch,
+            ):
+                loaded[sud_id].miscs.append(tuple(row))
+            self.entries.update(loaded)
+        self.ids = sorted(self.entries)
+
+    def recipe_ids(self):
+        with self.lock:
+            self.sync()
+            return list(self.ids)
+
+    def list(self, after, limit):
+        # Sud entries with ID > after (keyset pagination). Returns the recipes and the total number of recipes
+        with self.lock:
+            self.sync()
+            i = bisect.bisect_right(self.ids, int(after or 0))
+            entries = [(sud_id, self.entries[sud_id]) for sud_id in self.ids[i : i + limit]]
+            total = len(self.ids)
+        return [
+            {
+                "id": sud_id,
+                "name": entry.name,
+                "boil_time": entry.boil_time,
+                "steps": len(entry.mash),
+                "modified": entry.modified,
+            }
+            for sud_id, entry in entries
+        ], total
+
+    def search_documents(self):
+        # name, style, hops and miscs of all recipes for the search index
+        with self.lock:
+            self.sync()
+            return [
+                {
+                    "id": sud_id,
+                    "name": entry.name or "",
+                    "style": entry.style or "",
+                    "hops": [row[1] for row in entry.hops if row[1]],
+                    "miscs": [row[1] for row in entry.miscs if row[1]],
+                }
+                for sud_id, entry in ((sud_id, self.entries[sud_id]) for sud_id in self.ids)
+            ]
+
+    def parse(self, Recipe_ID):
+        with self.lock:
+            self.sync()
+            try:
+                entry = self.entries[int(Recipe_ID)]
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Sud ID {} not found".format(Recipe_ID))
+            return read_recipe(entry)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.syncs, recipes=len(self.entries))
+
+
+def read_recipe(entry):
+    # Recipe Name and boiltime
+    recipe = Recipe(entry.name, float(entry.boil_time))
+
+    # Mash plan. Typ 0 is the MashIn (TempWasser is the temp for mashing in)
+    mashin = None
+    for row in entry.mash:
+        if row[0] == 0:
+            if mashin is None and row[2] is not None:
+                mashin = MashStep("MashIn", float(row[2]), 0)
+        else:
+            recipe.mash_steps.append(MashStep(str(row[1]), float(row[3]), float(row[4])))
+    if mashin is not None:
+        recipe.mash_steps.insert(0, mashin)
+
+    # hop addition times. Negative times are whirlpool additions
+    for row in entry.hops:
+        if row[2] == 1:
+            recipe.first_wort.append(row[1])
+        elif row[0] < 0:
+            # from kbh this value comes as negative but must be positive
+            if recipe.whirlpool_time is None:
+                recipe.whirlpool_time = abs(row[0])
+        else:
+            recipe.hops.append(Addition(row[1], float(row[0])))
+
+    # misc addition times (Zeitpunkt 1: boil)
+    for row in entry.miscs:
+        if row[2] == 1:
+            recipe.miscs.append(Addition(row[1], float(row[0])))
+    return recipe
+
+
+databases = {}
+databases_lock = threading.Lock()
+# entries of the last closed database. A new upload of kbh.db is stored under a new path (upload.py),
+# its catalog starts with the entries of the replaced file and reads only the changed Sud entries
+previous_entries = {}
+
+
+def get_database(path):
+    path = os.path.abspath(path)
+    with databases_lock:
+        database = databases.get(path)
+        if database is None:
+            # raises FileNotFoundError, no catalog is registered for a missing file
+            os.stat(path)
+            database = databases[path] = Database(path, previous_entries)
+    return database
+
+
+def parse(path, Recipe_ID):
+    return get_database(path).parse(Recipe_ID)
+
+
+def recipe_ids(path):
+    return get_database(path).recipe_ids()
+
+
+def search_documents(path):
+    return get_database(path).search_documents()
+
+
+def list_recipes(path, after, limit):
+    return get_database(path).list(after, limit)
+
+
+def stats():
+    with databases_lock:
+        current = list(databases.items())
+    return {path: database.stats() for path, database in current}
+
+
+def close(path=None):
+    global previous_entries
+    with databases_lock:
+        if path is None:
+            paths = list(databases)
+        else:
+            paths = [os.path.abspath(path)]
+        for path in paths:
+            database = databases.pop(path, None)
+            if database is not None:
+                with database.lock:
+                    database.close()
+                    if database.entries:
+                        previous_entries = database.entries
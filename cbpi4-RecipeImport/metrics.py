@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Counters and histograms of the recipe import, exported in the Prometheus text format (GET /creation/metrics).
+# Recording a value is a dict lookup and a few additions, metrics are always on.
+import bisect
+import contextlib
+import time
+
+# seconds. Imports take from a few ms (cached plan) up to seconds (Brewfather download, large files)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s counter" % self.name,
+        ]
+        for labels, value in sorted(self.values.items()):
+            lines.append(
+                "%s%s %s" % (self.name, format_labels(self.labels, labels), value)
+            )
+        return lines
+
+
+class Gauge(Counter):
+    # value is read when the metrics are requested
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self):
+        if self.collect is not None:
+            self.values = dict(self.collect())
+        lines = super().render()
+        lines[1] = "# TYPE %s gauge" % self.name
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s histogram" % self.name,
+        ]
+        names = self.labels + ("le",)
+        for labels, (counts, total) in sorted(self.values.items()):
+            count = 0
+            for bucket, value in zip(self.buckets + ("+Inf",), counts):
+                count += value
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (self.name, format_labels(names, labels + (bucket,)), count)
+                )
+            lines.append(
+                "%s_sum%s %s" % (self.name, format_labels(self.labels, labels), total)
+            )
+            lines.append(
+                "%s_count%s %d" % (self.name, format_labels(self.labels, labels), count)
+            )
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), collect=None):
+        return self.add(Gauge(name, help, labels, collect))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# metrics of the plugin
+class ImportMetrics(Registry):
+    def __init__(self):
+        super().__init__()
+        self.jobs = self.counter(
+            "recipe_import_jobs_total", "Finished imports", ("source", "status")
+        )
+        self.duration = self.histogram(
+            "recipe_import_duration_seconds", "Duration of an import", ("source",)
+        )
+        self.parse = self.histogram(
+            "recipe_import_parse_seconds",
+            "Reading and parsing of a recipe",
+            ("source",),
+        )
+        self.plan = self.histogram(
+            "recipe_import_plan_seconds", "Conversion of a recipe into steps", ("source",)
+        )
+        self.config = self.histogram(
+            "recipe_import_config_seconds", "Resolution of the config values"
+        )
+        self.create_recipe = self.histogram(
+            "recipe_import_create_recipe_seconds",
+            "Create, brew and remove of the recipe in the recipe book",
+        )
+        self.write = self.histogram(
+            "recipe_import_write_seconds",
+            "Writing of the steps to the mash profile or recipe book",
+            ("target",),
+        )
+        self.step_post = self.histogram(
+            "recipe_import_step_post_seconds", "Step added via the /step2 api"
+        )
+        self.bf_fetch = self.histogram(
+            "recipe_import_bf_fetch_seconds", "Download of a Brewfather recipe"
+        )
+        self.cache = self.counter(
+            "recipe_import_cache_total",
+            "Lookups in the plan cache and in the Brewfather catalog",
+            ("cache", "result"),
+        )
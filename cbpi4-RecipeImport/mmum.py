@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Parser for MaischeMalzundMehr json recipe files (mmum.json)
+import collections
+import json
+import os
+import re
+
+from .cache import DocumentCache
+from .recipe import Addition, MashStep, Recipe
+
+# Numbered fields of a mmum.json file
+FIRST_WORT = re.compile(r"^Hopfen_VWH_(\d+)_(\w+)$")
+HOP = re.compile(r"^Hopfen_(\d+)_(\w+)$")
+MISC = re.compile(r"^WeitereZutat_Wuerze_(\d+)_(\w+)$")
+REST = re.compile(r"^Infusion_Rast(temperatur|zeit)(\d+)$")
+
+Hop = collections.namedtuple("Hop", "index name time whirlpool")
+FirstWortHop = collections.namedtuple("FirstWortHop", "index name")
+Misc = collections.namedtuple("Misc", "index name time whirlpool")
+Rest = collections.namedtuple("Rest", "index temp time")
+
+
+# mmum.json with the numbered fields grouped into lists (sorted by number, no limit of the number of entries).
+# malformed: keys of fields that are missing or can't be read
+class Document:
+    __slots__ = ("data", "rests", "hops", "first_wort", "miscs", "malformed")
+
+    def __init__(self, data):
+        self.data = data
+        self.rests = []
+        self.hops = []
+        self.first_wort = []
+        self.miscs = []
+        self.malformed = []
+
+
+def load_document(content):
+    return normalize(json.loads(content))
+
+
+# parsed mmum.json documents. The file is only loaded again if it has been changed.
+# Documents are shared between imports and must not be modified
+documents = DocumentCache(load_document)
+
+
+def addition_time(value):
+    # returns the alert time, True if the addition is a whirlpool addition and False if the time can't be read
+    value = str(value)
+    if value == "Whirlpool":
+        return float(0), True, True
+    try:
+        alert = float(value)
+    except ValueError:
+        return float(0), False, False
+    if alert < 0:
+        return float(0), True, True
+    return alert, False, True
+
+
+def hop_name(fields):
+    if "Menge" in fields and "alpha" in fields:
+        return "%sg %s %s%% alpha" % (fields["Menge"], fields["Sorte"], fields["alpha"])
+    return str(fields["Sorte"])
+
+
+def normalize(e):
+    # one pass over all keys of the file. Numbered fields are collected per group and number
+    groups = {"first_wort": {}, "hops": {}, "miscs": {}, "rests": {}}
+    for key, value in e.items():
+        if key.startswith("Hopfen_VWH_"):
+            match = FIRST_WORT.match(key)
+            group = "first_wort"
+        elif key.startswith("Hopfen_"):
+            match = HOP.match(key)
+            group = "hops"
+        elif key.startswith("WeitereZutat_Wuerze_"):
+            match = MISC.match(key)
+            group = "miscs"
+        elif key.startswith("Infusion_Rast"):
+            match = REST.match(key)
+            if match is not None:
+                groups["rests"].setdefault(int(match.group(2)), {})[match.group(1)] = value
+            continue
+        else:
+            continue
+        if match is not None:
+            groups[group].setdefault(int(match.group(1)), {})[match.group(2)] = value
+
+    document = Document(e)
+    malformed = document.malformed
+    for idx, fields in sorted(groups["rests"].items()):
+        try:
+            document.rests.append(
+                Rest(idx, float(fields["temperatur"]), float(fields["zeit"]))
+            )
+        except (KeyError, TypeError, ValueError):
+            malformed.append("Infusion_Rastzeit{}".format(idx))
+
+    for group, prefix in (("hops", "Hopfen_{}_"), ("miscs", "WeitereZutat_Wuerze_{}_")):
+        name_field = "Sorte" if group == "hops" else "Name"
+        for idx, fields in sorted(groups[group].items()):
+            key = prefix.format(idx)
+            if not any(value not in (None, "") for value in fields.values()):
+                # unused entry
+                continue
+            if name_field not in fields or "Kochzeit" not in fields:
+                malformed.append(
+                    key + (name_field if name_field not in fields else "Kochzeit")
+                )
+                continue
+            alert, whirlpool, valid = addition_time(fields["Kochzeit"])
+            if not valid:
+                # the addition is kept with an alert at the end of the boil
+                malformed.append(key + "Kochzeit")
+            if group == "hops":
+                document.hops.append(Hop(idx, hop_name(fields), alert, whirlpool))
+            else:
+                name = "%s%s %s" % (
+                    fields.get("Menge", ""),
+                    fields.get("Einheit", ""),
+                    fields["Name"],
+                )
+                document.miscs.append(Misc(idx, name.strip(), alert, whirlpool))
+
+    for idx, fields in sorted(groups["first_wort"].items()):
+        if fields.get("Sorte") in (None, ""):
+            if any(value not in (None, "") for value in fields.values()):
+                malformed.append("Hopfen_VWH_{}_Sorte".format(idx))
+            continue
+        document.first_wort.append(FirstWortHop(idx, hop_name(fields)))
+    return document
+
+
+def parse(path):
+    return parse_document(documents.get(path))
+
+
+def list_recipes(path, after, limit):
+    # mmum.json contains one recipe
+    document = documents.get(path)
+    if int(after or 0) >= 1 or limit < 1:
+        return [], 1
+    return [
+        {
+            "id": 1,
+            "name": document.data.get("Name"),
+            "boil_time": float(document.data.get("Kochzeit_Wuerze") or 0),
+            "steps": len(document.rests),
+            "modified": os.path.getmtime(path),
+        }
+    ], 1
+
+
+def search_documents(path):
+    # mmum.json contains one recipe
+    document = documents.get(path)
+    hops = [str(hop.name) for hop in document.hops]
+    hops.extend(str(hop.name) for hop in document.first_wort)
+    return [
+        {
+            "id": 1,
+            "name": document.data.get("Name") or "",
+            "style": document.data.get("Sorte") or "",
+            "hops": hops,
+            "miscs": [str(misc.name) for misc in document.miscs],
+        }
+    ]
+
+
+def parse_document(document):
+    e = document.data
+    recipe = Recipe(e["Name"], float(e["Kochzeit_Wuerze"]))
+    recipe.truncate_fahrenheit = True
+    recipe.gravity_prompt = True
+
+    for rest in document.rests:
+        recipe.mash_steps.append(
+            MashStep("Rast {}".format(rest.index), rest.temp, rest.time)
+        )
+    if "Infusion_Einmaischtemperatur" in e:
+        recipe.strike_temp = float(e["Infusion_Einmaischtemperatur"])
+    if "Abmaischtemperatur" in e:
+        recipe.mash_out_temp = float(e["Abmaischtemperatur"])
+
+    # get the hop addition times
+    for hop in document.hops:
+        name = hop.name + " whirlpool" if hop.whirlpool else hop.name
+        recipe.hops.append(Addition(name, hop.time))
+
+    for hop in document.first_wort:
+        recipe.first_wort.append(hop.name)
+
+    for misc in document.miscs:
+        name = misc.name + " whirlpool" if misc.whirlpool else misc.name
+        recipe.miscs.append(Addition(name, misc.time))
+
+    # all malformed fields in one warning
+    if document.malformed:
+        recipe.warnings.append(
+            "Please change json-File at {}".format(", ".join(document.malformed))
+        )
+    return recipe
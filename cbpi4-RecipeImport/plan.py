@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Builds the steps for the mash profile from a Recipe (recipe.py) and the config values of the plugin
+# (see RecipeCreation.get_config_values). Each step is a dict in the format of the cbpi step api.
+import heapq
+import itertools
+
+MASHIN_NOTIFICATION = "Target temperature reached. Please add malt."
+LAUTERING_NOTIFICATION = (
+    "Mash Process completed. Please start lautering and press next to start boil."
+)
+GRAVITY_NOTIFICATION = "What is the original gravity of the beer wort?"
+
+
+def step_type(value, default):
+    return value if value not in (None, "", "None") else default
+
+
+class StepPlanBuilder:
+    def __init__(self, config):
+        self.config = config
+        self.AutoMode = config["AutoMode"]
+        self.kettle_id = config["kettle_id"]
+        self.sensor = config["kettle"].sensor
+        self.boilkettle_id = config["boilkettle_id"]
+        self.boilsensor = config["boilkettle"].sensor
+        # number of hop alerts of the boil step
+        self.slots = max(1, int(config["boil_alerts"]))
+
+    def convert(self, temp):
+        # all recipe temps are in °C. Strike, mash out and fermentation temps are rounded
+        if self.config["temp_unit"] == "C":
+            return round(float(temp))
+        return round(9.0 / 5.0 * float(temp) + 32)
+
+    def mash_temp(self, recipe, temp):
+        # mash step temps: whole °C, in °F rounded from whole °C or truncated (recipe.truncate_fahrenheit)
+        if self.config["temp_unit"] == "C":
+            return int(temp)
+        if recipe.truncate_fahrenheit:
+            return int(round(9.0 / 5.0 * float(temp) + 32, 2))
+        return round(9.0 / 5.0 * int(temp) + 32)
+
+    def build(self, recipe):
+        steps = self.mash_steps(recipe)
+        # Lautering -> Simple step that sends notification and waits for user input to move to next step (AutoNext=No)
+        if self.config["mashout"] == "NotificationStep":
+            steps.append(
+                self.notification_step(
+                    "Lautering", LAUTERING_NOTIFICATION, "NotificationStep"
+                )
+            )
+        steps.extend(self.boil_steps(recipe))
+        # Measure Original Gravity -> Simple step that sends notification
+        if recipe.gravity_prompt:
+            steps.append(
+                self.notification_step(
+                    "Measure Original Gravity", GRAVITY_NOTIFICATION, "NotificationStep"
+                )
+            )
+        if recipe.whirlpool_time is None:
+            steps.extend(self.whirlpool_cooldown(recipe))
+        else:
+            steps.extend(
+                self.whirlpool_cooldown(recipe, str(int(recipe.whirlpool_time)))
+            )
+        return steps
+
+    def mash_step(self, name, temp, timer, type, notification=""):
+        return {
+            "name": name,
+            "props": {
+                "AutoMode": self.AutoMode,
+                "Kettle": self.kettle_id,
+                "Sensor": self.sensor,
+                "Temp": str(temp),
+                "Timer": str(int(timer)),
+                "Notification": notification,
+            },
+            "status_text": "",
+            "status": "I",
+            "type": type,
+        }
+
+    def notification_step(self, name, notification, type):
+        return {
+            "name": name,
+            "props": {
+                "AutoNext": "No",
+                "Kettle": self.kettle_id,
+                "Notification": notification,
+            },
+            "status_text": "",
+            "status": "I",
+            "type": type,
+        }
+
+    def mash_steps(self, recipe):
+        # Mash Steps -> first step is different as it heats up to defined temp and stops with notification to add malt
+        # AutoMode is yes to start and stop automatic mode or each step
+        mashin_type = step_type(self.config["mashin"], "MashInStep")
+        mash_type = step_type(self.config["mash"], "MashStep")
+        steps = []
+        for idx, row in enumerate(recipe.mash_steps):
+            name = row.name
+            type = mash_type
+            notification = ""
+            if idx == 0:
+                if row.time == 0:
+                    type = mashin_type
+                    notification = MASHIN_NOTIFICATION
+                    if name is None or name == "":
+                        name = "MashIn"
+                elif self.config["addmashin"] == "Yes":
+                    # recipe has no mashin step -> heat up to strike temp (or temp of first step) and wait for malt
+                    if recipe.strike_temp is None:
+                        temp = self.mash_temp(recipe, row.temp)
+                    else:
+                        temp = self.convert(recipe.strike_temp)
+                    steps.append(
+                        self.mash_step(
+                            "MashIn", temp, 0, mashin_type, MASHIN_NOTIFICATION
+                        )
+                    )
+            steps.append(
+                self.mash_step(
+                    name, self.mash_temp(recipe, row.temp), row.time, type, notification
+                )
+            )
+
+        # MashOut -> mashStep to reach mashout-temp for 1 min
+        if recipe.mash_out_temp is not None:
+            mash_out_temp = self.convert(recipe.mash_out_temp)
+            if not recipe.mash_steps or self.mash_temp(
+                recipe, recipe.mash_steps[-1].temp
+            ) != mash_out_temp:
+                steps.append(self.mash_step("MashOut", mash_out_temp, 1, mash_type))
+        return steps
+
+    def boil_steps(self, recipe):
+        # Boil step including hop alarms and alarm for first wort hops -> Automode is set tu yes
+        # The boil step has a fixed number of alerts. If there are more alerts, the boil is split into chained
+        # boil steps: each step ends at the time of the first alert of the next step
+        chunks = []
+        alerts = self.getBoilAlerts(recipe.hops, recipe.miscs, float(recipe.boil_time))
+        while alerts:
+            chunk = heapq.nlargest(self.slots, alerts, key=lambda alert: alert[0])
+            alerts = [alert for alert in alerts if alert[0] < chunk[-1][0]]
+            chunks.append(chunk)
+        if not chunks:
+            chunks.append([])
+
+        FirstWort = self.getFirstWort(recipe.first_wort)
+        steps = []
+        start = float(recipe.boil_time)
+        for idx, chunk in enumerate(chunks):
+            end = chunks[idx + 1][0][0] if idx + 1 < len(chunks) else 0
+            end = min(max(end, 0), start)
+            step = {
+                "name": "Boil Step" if idx == 0 else "Boil Step {}".format(idx + 1),
+                "props": {
+                    "AutoMode": self.AutoMode,
+                    "Kettle": self.boilkettle_id,
+                    "Sensor": self.boilsensor,
+                    "Temp": self.config["boiltemp"],
+                    "Timer": str(int(start - end)),
+                    "First_Wort": FirstWort[0] if idx == 0 else "No",
+                    "First_Wort_text": FirstWort[1] if idx == 0 else "",
+                    "LidAlert": "Yes" if idx == 0 else "No",
+                },
+                "status_text": "",
+                "status": "I",
+                "type": step_type(self.config["boil"], "BoilStep"),
+            }
+            # unused slots stay empty. The standard BoilStep has 6 alerts
+            for slot in range(max(self.slots, 6)):
+                alert = [None, None]
+                if slot < len(chunk):
+                    alert = [chunk[slot][0] - end, chunk[slot][1]]
+                step["props"]["Hop_{}".format(slot + 1)] = alert[0]
+                step["props"]["Hop_{}_text".format(slot + 1)] = alert[1]
+            steps.append(step)
+            start = end
+        return steps
+
+    def getBoilAlerts(self, hops, miscs, boil_time):
+        ## Hops and miscelaneous additions during boil time. Additions at the same time share one alert
+        # additions before the boil time (e.g. 90 min hops in a 60 min boil) are due at the start of the boil
+        additions = {}
+        for addition in itertools.chain(hops, miscs):
+            try:
+                time = min(float(addition.time), boil_time)
+            except (TypeError, ValueError):
+                continue
+            if time > -1:
+                additions.setdefault(time, []).append(addition.name)
+        return [[time, " and ".join(names)] for time, names in additions.items()]
+
+    def getFirstWort(self, names):
+        alert = "Yes" if len(names) != 0 else "No"
+        return [alert, " and ".join(names)]
+
+    def whirlpool_cooldown(self, recipe, time="15"):
+        steps = []
+        cooldown = self.config["cooldown"]
+        # Add Waitstep as Whirlpool
+        if cooldown != "WaiStep" and cooldown != "":
+            steps.append(
+                {
+                    "name": "Whirlpool",
+                    "props": {"Kettle": self.boilkettle_id, "Timer": time},
+                    "status_text": "",
+                    "status": "I",
+                    "type": "WaitStep",
+                }
+            )
+
+        # CoolDown step is sending a notification when cooldowntemp is reached
+        type = step_type(cooldown, "WaitStep")
+        if type.find("Cooldown") != -1:
+            cooldown_sensor = self.config["cooldownsensor"]
+            if cooldown_sensor is None or cooldown_sensor == "":
+                # fall back to boilkettle sensor if no other sensor is specified
+                cooldown_sensor = self.boilsensor
+            step_temp = int(float(self.config["cooldowntemp"]))
+            if recipe.fermentation_temp is not None:
+                step_temp = max(step_temp, self.convert(recipe.fermentation_temp))
+            steps.append(
+                {
+                    "name": "Cooldown",
+                    "props": {
+                        "Kettle": self.boilkettle_id,
+                        "Timer": "",
+                        "Temp": step_temp,
+                        "Sensor": cooldown_sensor,
+                        "Actor": self.config["cooldownactor"],
+                    },
+                    "status_text": "",
+                    "status": "I",
+                    "type": type,
+                }
+            )
+        return steps
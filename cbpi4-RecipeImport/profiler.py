@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# CPU (cProfile) and memory (tracemalloc) profile of a single import.
+# cProfile only sees the event loop thread -> the parsers of a profiled import run in the event loop instead of the executor.
+# Other coroutines that run during the import are part of the profile as well.
+import cProfile
+import linecache
+import pstats
+import tracemalloc
+
+
+class ImportProfile:
+    def __init__(self, top=15):
+        self.top = top
+        self.profiler = None
+        self.snapshot = None
+        self.peak = 0
+        self.tracemalloc = False
+
+    def start(self):
+        # tracemalloc may already be used by someone else -> it is only stopped again if it was started here
+        self.tracemalloc = not tracemalloc.is_tracing()
+        if self.tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+            )
+        )
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self.tracemalloc:
+            tracemalloc.stop()
+
+    def hot_spots(self):
+        stats = pstats.Stats(self.profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            {
+                "function": "%s:%d(%s)" % function,
+                "calls": calls,
+                "tottime": round(tottime * 1000, 3),
+                "cumtime": round(cumtime * 1000, 3),
+            }
+            for function, (_, calls, tottime, cumtime, _) in rows[: self.top]
+        ]
+
+    def allocations(self):
+        return [
+            {
+                "line": "%s:%d" % (stat.traceback[0].filename, stat.traceback[0].lineno),
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            }
+            for stat in self.snapshot.statistics("lineno")[: self.top]
+        ]
+
+    def save(self, prefix):
+        # writes <prefix>.prof (open with pstats or snakeviz) and <prefix>.alloc.txt. Times in ms
+        self.profiler.dump_stats(prefix + ".prof")
+        allocations = self.allocations()
+        with open(prefix + ".alloc.txt", "w") as f:
+            f.write("peak: %.1f kB\n" % (self.peak / 1024))
+            for stat in self.snapshot.statistics("lineno")[: self.top * 4]:
+                f.write("%s\n" % stat)
+        return {
+            "prof": prefix + ".prof",
+            "allocations_file": prefix + ".alloc.txt",
+            "peak_kb": round(self.peak / 1024, 1),
+            "hot_spots": self.hot_spots(),
+            "allocations": allocations,
+        }
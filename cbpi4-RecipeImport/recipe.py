@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Format neutral representation of a recipe.
+# Every recipe source (kbh, beerxml, mmum json, brewfather) has a parser that returns a Recipe.
+# The StepPlanBuilder (plan.py) turns a Recipe into the steps of the mash profile.
+# Temperatures are always stored in °C, times in minutes. Conversion to the system unit is done by the builder.
+
+
+class MashStep:
+    __slots__ = ("name", "temp", "time")
+
+    def __init__(self, name, temp, time):
+        self.name = name
+        self.temp = temp
+        self.time = time
+
+    def __repr__(self):
+        return "MashStep(%r, %r, %r)" % (self.name, self.temp, self.time)
+
+
+class Addition:
+    # hop or misc addition during boil. time is the remaining boil time in minutes
+    __slots__ = ("name", "time")
+
+    def __init__(self, name, time):
+        self.name = name
+        self.time = time
+
+    def __repr__(self):
+        return "Addition(%r, %r)" % (self.name, self.time)
+
+
+class Recipe:
+    __slots__ = (
+        "name",
+        "boil_time",
+        "mash_steps",
+        "strike_temp",
+        "mash_out_temp",
+        "hops",
+        "miscs",
+        "first_wort",
+        "whirlpool_time",
+        "fermentation_temp",
+        "gravity_prompt",
+        "truncate_fahrenheit",
+        "warnings",
+    )
+
+    def __init__(self, name, boil_time):
+        self.name = name
+        self.boil_time = boil_time
+        self.mash_steps = []
+        # temp for an additional MashIn step (if AddMashInStep is set and the recipe has no mashin step)
+        self.strike_temp = None
+        # adds a MashOut step if it differs from the last mash step
+        self.mash_out_temp = None
+        self.hops = []
+        self.miscs = []
+        # names of the first wort hops
+        self.first_wort = []
+        self.whirlpool_time = None
+        # first fermentation step temp. Used as cooldown target if higher than the cooldown temp setting
+        self.fermentation_temp = None
+        # adds a notification step to measure the original gravity after the boil
+        self.gravity_prompt = False
+        # mash temps in °F are truncated instead of rounded (BeerXML and MMuM imports always did that)
+        self.truncate_fahrenheit = False
+        # problems found while parsing that did not stop the import
+        self.warnings = []
+
+    def __repr__(self):
+        return "Recipe(%r, %d mash steps, %d hops, %d miscs)" % (
+            self.name,
+            len(self.mash_steps),
+            len(self.hops),
+            len(self.miscs),
+        )
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Full text search over the recipes of all sources (GET /creation/search?q=).
+# In memory inverted index of recipe names, styles, hops and miscs. One index per source that is rebuilt after the source changed
+import asyncio
+import bisect
+import importlib
+import json
+import re
+
+# score of a match in the field
+WEIGHTS = {"name": 4, "style": 2, "hops": 1, "miscs": 1}
+TOKEN = re.compile(r"\w+")
+MODULES = {"kbh": "kbh", "xml": "beerxml", "json": "mmum"}
+
+
+def tokenize(text):
+    return TOKEN.findall(text.casefold())
+
+
+class SearchIndex:
+    def __init__(self, documents):
+        self.documents = []
+        # token -> {document: score}
+        self.postings = {}
+        for document in documents:
+            n = len(self.documents)
+            self.documents.append(
+                {"id": document["id"], "name": document["name"], "style": document["style"]}
+            )
+            for field, weight in WEIGHTS.items():
+                values = document[field]
+                if isinstance(values, str):
+                    values = [values]
+                for value in values:
+                    for token in tokenize(value):
+                        scores = self.postings.setdefault(token, {})
+                        scores[n] = scores.get(n, 0) + weight
+        self.tokens = sorted(self.postings)
+
+    def match(self, term):
+        # exact matches count full, prefix matches (e.g. "cit" -> "citra") half
+        scores = dict(self.postings.get(term, {}))
+        i = bisect.bisect_left(self.tokens, term)
+        while i < len(self.tokens) and self.tokens[i].startswith(term):
+            if self.tokens[i] != term:
+                for n, score in self.postings[self.tokens[i]].items():
+                    scores[n] = scores.get(n, 0) + score / 2
+            i += 1
+        return scores
+
+    def search(self, query):
+        # all terms of the query must match. Returns (score, document)
+        result = None
+        for term in tokenize(query):
+            scores = self.match(term)
+            if result is None:
+                result = scores
+            else:
+                result = {n: result[n] + scores[n] for n in result if n in scores}
+            if not result:
+                return []
+        if result is None:
+            return []
+        return [(score, self.documents[n]) for n, score in result.items()]
+
+
+# build functions run in the parse executor
+def build_index(source, path):
+    module = importlib.import_module("." + MODULES[source], __package__)
+    return SearchIndex(module.search_documents(path))
+
+
+def build_bf_index(recipes):
+    # recipes: (id, summary, content). Only the summary is indexed if the recipe has not been downloaded yet
+    from .brewfather import search_document
+
+    documents = []
+    for recipe_id, summary, content in recipes:
+        bf_recipe = summary
+        if content is not None:
+            try:
+                bf_recipe = json.loads(content)
+            except ValueError:
+                pass
+        documents.append(search_document(recipe_id, bf_recipe))
+    return SearchIndex(documents)
+
+
+class RecipeSearch:
+    def __init__(self):
+        # source -> (key, SearchIndex). key: content hash of the file or state of the Brewfather catalog
+        self.indexes = {}
+        self.locks = {}
+
+    def lock(self, source):
+        return self.locks.setdefault(source, asyncio.Lock())
+
+    def get(self, source, key):
+        entry = self.indexes.get(source)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def put(self, source, key, index):
+        self.indexes[source] = (key, index)
+
+    def stats(self):
+        return {
+            source: {"recipes": len(index.documents), "tokens": len(index.tokens)}
+            for source, (key, index) in self.indexes.items()
+        }
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Read only snapshot of the config values used by the imports (step types, kettles, sensors, temps, unit)
+import asyncio
+import functools
+import logging
+import types
+
+logger = logging.getLogger(__name__)
+
+
+# The snapshot is built on first use and rebuilt after a change of the cbpi config or of a kettle.
+# cbpi does not fire events for these changes, therefore the methods of the controllers that change them are observed.
+# As long as the config or the kettle controller can't be observed, the snapshot is built again for every import
+class SettingsSnapshot:
+    def __init__(self, build):
+        self.build = build
+        self.value = None
+        self.observed = False
+
+    def get(self):
+        value = self.value
+        if value is None:
+            value = types.MappingProxyType(self.build())
+            logger.debug("Recipe import settings: %s" % dict(value))
+            if self.observed:
+                self.value = value
+        return value
+
+    def invalidate(self, *args, **kwargs):
+        self.value = None
+
+    def observe(self, controller, *names):
+        # wraps the methods of the controller to invalidate the snapshot after each call
+        observed = False
+        for name in names:
+            method = getattr(controller, name, None)
+            if method is None:
+                continue
+            setattr(controller, name, self.wrap(method))
+            observed = True
+        return observed
+
+    def wrap(self, method):
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    self.invalidate()
+
+        else:
+
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self.invalidate()
+
+        return wrapper
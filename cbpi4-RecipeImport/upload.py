@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Content addressed storage of uploaded recipe files (/creation/upload).
+# Files are stored as <root>/<sha1><ext>, an identical file is stored only once and keeps its caches.
+# manifest.json: uploaded file name -> hash and the active (last uploaded) file of each source.
+# Only the active file of a source can be imported: a replaced file is removed from the manifest and deleted
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+
+EXTENSIONS = {"kbh": ".db", "xml": ".xml", "json": ".json"}
+
+
+def detect_source(filename):
+    extension = os.path.splitext(filename or "")[1].lower()
+    for source, source_extension in EXTENSIONS.items():
+        if extension == source_extension:
+            return source
+    return None
+
+
+class UploadStore:
+    def __init__(self, root):
+        self.root = root
+        self.manifest = {"files": {}, "active": {}}
+
+    def load(self):
+        try:
+            with open(os.path.join(self.root, "manifest.json")) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def path(self, digest, source):
+        return os.path.join(self.root, digest + EXTENSIONS[source])
+
+    def referenced(self, digest, source):
+        return any(
+            entry["hash"] == digest and entry["source"] == source
+            for entry in self.manifest["files"].values()
+        )
+
+    def remove(self, digest, source):
+        # deletes a stored file and the index of the BeerXML parser next to it
+        path = self.path(digest, source)
+        for name in (path, path + ".index.json"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def active(self, source):
+        name = self.manifest["active"].get(source)
+        return self.manifest["files"].get(name) if name is not None else None
+
+    def select(self, source, upload_file):
+        # file of the source: last upload via /creation/upload or the file of the cbpi upload, whatever is newer
+        entry = self.active(source)
+        if entry is not None:
+            try:
+                if os.path.getmtime(upload_file) > entry["uploaded"]:
+                    return upload_file
+            except OSError:
+                pass
+            return self.path(entry["hash"], source)
+        return upload_file
+
+    async def store(self, part, source, name, chunk_size=1 << 16):
+        # streams a multipart file to disk and hashes it on the way. Returns the manifest entry and the replaced entry
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+        tmp = os.path.join(self.root, "upload-%s.tmp" % uuid.uuid4().hex)
+        digest = hashlib.sha1()
+        size = 0
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            while True:
+                chunk = await part.read_chunk(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.remove, tmp)
+            raise
+        await asyncio.to_thread(f.close)
+
+        digest = digest.hexdigest()
+        path = self.path(digest, source)
+        stored = await asyncio.to_thread(os.path.exists, path)
+        if stored:
+            # identical file has been uploaded before
+            await asyncio.to_thread(os.remove, tmp)
+        else:
+            await asyncio.to_thread(os.replace, tmp, path)
+        replaced = self.active(source)
+        entry = {
+            "name": name,
+            "hash": digest,
+            "source": source,
+            "size": size,
+            "uploaded": time.time(),
+            "stored": stored,
+        }
+        self.manifest["files"][name] = entry
+        self.manifest["active"][source] = name
+        if replaced is not None and replaced["name"] != name:
+            self.manifest["files"].pop(replaced["name"], None)
+        await asyncio.to_thread(self.save)
+        return entry, replaced
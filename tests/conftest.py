@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# The plugin is imported from the repository (package directory cbpi4-RecipeImport). cbpi and the test requirements
+# have to be installed: pip install -r tests/requirements.txt
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import start_plugin  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # config folder of the FakeCbpi. The plugin creates config/upload in the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "upload")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def plugin(loop, root):
+    # (FakeCbpi, RecipeCreation), steps are written to the step controller
+    cbpi, ext = loop.run_until_complete(start_plugin(root))
+    yield cbpi, ext
+    loop.run_until_complete(ext.shutdown())
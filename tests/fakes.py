@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Stand-in for the parts of cbpi that are used by the plugin
+import importlib
+import os
+
+from aiohttp import web
+
+# package directory of the plugin (imported from the repository root, see conftest.py)
+PACKAGE = "cbpi4-RecipeImport"
+
+
+def load_plugin(name=None):
+    # the plugin package or one of its modules
+    return importlib.import_module(PACKAGE if name is None else PACKAGE + "." + name)
+
+
+class Kettle:
+    def __init__(self, id):
+        self.id = id
+        self.sensor = "sensor-%s" % id
+
+
+class KettleController:
+    def find_by_id(self, id):
+        return Kettle(id)
+
+    # changes of the kettles are observed by the settings snapshot
+    async def add(self, item):
+        return item
+
+    async def update(self, item):
+        return item
+
+    async def delete(self, id):
+        pass
+
+    async def save(self):
+        pass
+
+
+class Config(dict):
+    async def add(self, name, value, type=None, description="", source="", options=None):
+        self[name] = value
+
+    async def set(self, name, value):
+        self[name] = value
+
+
+class ConfigFolder:
+    def __init__(self, root):
+        self.root = root
+
+    def get_upload_file(self, name):
+        return os.path.join(self.root, "upload", name)
+
+    def get_file_path(self, name):
+        return os.path.join(self.root, name)
+
+
+class StepController:
+    def __init__(self):
+        self.profile = []
+
+    def create(self, data):
+        return data
+
+    async def save(self):
+        pass
+
+
+class RecipeController:
+    def __init__(self):
+        self.book = {}
+
+    async def create(self, name):
+        recipe_id = "r%d" % len(self.book)
+        self.book[recipe_id] = {"basic": {"name": name}}
+        return recipe_id
+
+    async def save(self, recipe_id, data):
+        self.book[recipe_id] = data
+
+    async def brew(self, recipe_id):
+        pass
+
+    async def remove(self, recipe_id):
+        self.book.pop(recipe_id, None)
+
+
+class App:
+    def __init__(self):
+        self.on_cleanup = []
+
+
+class FakeCbpi:
+    # port: steps are posted to the /step2 api on this port instead of the step controller
+    def __init__(self, root, port=None, **config):
+        self.config = Config(
+            MASH_TUN="kettle",
+            steps_cooldown="CooldownStep",
+            brewfather_user_id="benchmark",
+            brewfather_api_key="benchmark",
+            recipe_import_bf_catalog_interval=0,
+            # every import is parsed and converted
+            recipe_import_plan_cache_size=0,
+        )
+        self.config.update(config)
+        self.config_folder = ConfigFolder(root)
+        self.kettle = KettleController()
+        # without step controller the steps are posted to the /step2 api
+        self.step = StepController() if port is None else None
+        self.recipe = RecipeController()
+        self.app = App()
+        self.static_config = {"port": port or 8000}
+        self.notifications = []
+
+    def register(self, obj, path):
+        pass
+
+    def notify(self, title, message, type=None, action=None):
+        self.notifications.append((title, message))
+
+
+# stand-in for the /step2 api of cbpi. Returns the runner, the port and the list of the posted steps
+async def start_step_server():
+    steps = []
+
+    async def add_step(request):
+        steps.append(await request.json())
+        return web.json_response({"id": len(steps)})
+
+    app = web.Application()
+    app.router.add_post("/step2/", add_step)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port, steps
+
+
+async def start_plugin(root, port=None, **config):
+    # RecipeCreation on a FakeCbpi with the config folder root. Returns the FakeCbpi and the extension
+    os.makedirs(os.path.join(root, "upload"), exist_ok=True)
+    cbpi = FakeCbpi(root, port, **config)
+    ext = load_plugin().RecipeCreation(cbpi)
+    await ext._task
+    return cbpi, ext
+
+
+async def import_recipe(ext, source, Recipe_ID, target="profile"):
+    # runs an import through the job queue of the plugin and returns the result of the job
+    context = load_plugin("jobs").ImportContext.create(
+        source, Recipe_ID, ext.settings.get(), target
+    )
+    job = await ext.get_queue().submit(context)
+    return await job.future
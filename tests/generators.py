@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Synthetic recipe sources for the tests and benchmarks (kbh, BeerXML, MMuM-JSON, Brewfather)
+import json
+import os
+import sqlite3
+
+HOPS = ("Magnum", "Perle", "Tettnanger", "Saaz", "Citra", "Mosaic", "Hallertau")
+
+
+# synthetic recipe sources. Every recipe has mash_steps rests, hops boil additions, a first wort hop and one misc
+def make_kbh(path, recipes=100, mash_steps=4, hops=4):
+    if os.path.exists(path):
+        os.remove(path)
+    c = sqlite3.connect(path)
+    c.executescript(
+        """CREATE TABLE Sud(ID INTEGER PRIMARY KEY, Sudname TEXT, Kochdauer REAL, Erstellt TEXT, Gespeichert TEXT);
+        CREATE TABLE Maischplan(ID INTEGER PRIMARY KEY, SudID INT, Typ INT, Name TEXT, TempWasser REAL, TempRast REAL, DauerRast REAL);
+        CREATE TABLE Hopfengaben(ID INTEGER PRIMARY KEY, SudID INT, Zeit REAL, Name TEXT, Vorderwuerze INT);
+        CREATE TABLE WeitereZutatenGaben(ID INTEGER PRIMARY KEY, SudID INT, Zugabedauer REAL, Name TEXT, Zeitpunkt INT, Typ INT);"""
+    )
+    for i in range(1, recipes + 1):
+        c.execute(
+            "INSERT INTO Sud VALUES(?,?,?,?,?)",
+            (i, "Sud %d" % i, 70, "2024-01-01 10:00:00", "2024-01-02 10:00:00"),
+        )
+        c.execute(
+            "INSERT INTO Maischplan(SudID,Typ,Name,TempWasser,TempRast,DauerRast) VALUES(?,?,?,?,?,?)",
+            (i, 0, "Einmaischen", 70, 57, 0),
+        )
+        for s in range(mash_steps):
+            c.execute(
+                "INSERT INTO Maischplan(SudID,Typ,Name,TempWasser,TempRast,DauerRast) VALUES(?,?,?,?,?,?)",
+                (i, 1, "Rast %d" % (s + 1), None, 62 + 3 * s, 20 + s),
+            )
+        for h in range(hops):
+            c.execute(
+                "INSERT INTO Hopfengaben(SudID,Zeit,Name,Vorderwuerze) VALUES(?,?,?,?)",
+                (i, 70 - h * 10, HOPS[h % len(HOPS)], 0),
+            )
+        c.execute(
+            "INSERT INTO Hopfengaben(SudID,Zeit,Name,Vorderwuerze) VALUES(?,?,?,?)",
+            (i, 0, "Hallertau", 1),
+        )
+        c.execute(
+            "INSERT INTO WeitereZutatenGaben(SudID,Zugabedauer,Name,Zeitpunkt,Typ) VALUES(?,?,?,?,?)",
+            (i, 15, "Irish Moss", 1, 1),
+        )
+    c.commit()
+    c.close()
+
+
+def make_beerxml(path, recipes=100, mash_steps=4, hops=4):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<RECIPES>\n')
+        for i in range(1, recipes + 1):
+            f.write(
+                "<RECIPE><NAME>Recipe %d</NAME><VERSION>1</VERSION><TYPE>All Grain</TYPE>"
+                "<STYLE><NAME>Pale Ale</NAME></STYLE><BOIL_TIME>70</BOIL_TIME><HOPS>" % i
+            )
+            for h in range(hops):
+                f.write(
+                    "<HOP><NAME>%s</NAME><USE>Boil</USE><TIME>%d</TIME></HOP>"
+                    % (HOPS[h % len(HOPS)], 70 - h * 10)
+                )
+            f.write(
+                "<HOP><NAME>Hallertau</NAME><USE>First Wort</USE><TIME>70</TIME></HOP></HOPS>"
+                "<MISCS><MISC><NAME>Irish Moss</NAME><USE>Boil</USE><TIME>15</TIME></MISC></MISCS>"
+                "<MASH><NAME>Mash</NAME><MASH_STEPS>"
+            )
+            for s in range(mash_steps):
+                f.write(
+                    "<MASH_STEP><NAME>Rast %d</NAME><STEP_TEMP>%d</STEP_TEMP><STEP_TIME>%d</STEP_TIME></MASH_STEP>"
+                    % (s + 1, 62 + 3 * s, 20 + s)
+                )
+            f.write("</MASH_STEPS></MASH></RECIPE>\n")
+        f.write("</RECIPES>\n")
+
+
+def make_mmum(path, mash_steps=4, hops=4):
+    e = {
+        "Name": "MMuM Recipe",
+        "Kochzeit_Wuerze": "70",
+        "Infusion_Einmaischtemperatur": "70",
+        "Abmaischtemperatur": "78",
+        "Hopfen_VWH_1_Sorte": "Hallertau",
+        "Hopfen_VWH_1_Menge": "10",
+        "Hopfen_VWH_1_alpha": "4",
+        "WeitereZutat_Wuerze_1_Name": "Irish Moss",
+        "WeitereZutat_Wuerze_1_Menge": "5",
+        "WeitereZutat_Wuerze_1_Einheit": "g",
+        "WeitereZutat_Wuerze_1_Kochzeit": "15",
+    }
+    for s in range(1, mash_steps + 1):
+        e["Infusion_Rasttemperatur%d" % s] = str(59 + 3 * s)
+        e["Infusion_Rastzeit%d" % s] = str(19 + s)
+    for h in range(1, hops + 1):
+        e["Hopfen_%d_Sorte" % h] = HOPS[(h - 1) % len(HOPS)]
+        e["Hopfen_%d_Menge" % h] = "20"
+        e["Hopfen_%d_alpha" % h] = "8"
+        e["Hopfen_%d_Kochzeit" % h] = str(80 - h * 10)
+    with open(path, "w") as f:
+        json.dump(e, f)
+
+
+def make_brewfather(recipe_id, mash_steps=4, hops=4, strike_temp=70.5):
+    # raw api response (bytes) as it is stored in the Brewfather catalog
+    bf_recipe = {
+        "_id": recipe_id,
+        "name": "BF Recipe %s" % recipe_id,
+        "boilTime": 70,
+        "data": {"strikeTemp": strike_temp},
+        "mash": {
+            "steps": [
+                {"name": "Rast %d" % (s + 1), "stepTemp": 62 + 3 * s, "stepTime": 20 + s}
+                for s in range(mash_steps)
+            ]
+        },
+        "hops": [
+            {"name": HOPS[h % len(HOPS)], "use": "Boil", "time": 70 - h * 10}
+            for h in range(hops)
+        ]
+        + [{"name": "Hallertau", "use": "First Wort", "time": 70}],
+        "miscs": [{"name": "Irish Moss", "use": "Boil", "time": 15}],
+        "fermentation": {"steps": [{"stepTemp": 19}]},
+    }
+    return json.dumps(bf_recipe).encode("utf-8")
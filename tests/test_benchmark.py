@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Benchmarks of the recipe import with synthetic recipes of all sources and growing sizes (pytest-benchmark).
+# parse: reading the recipe from the source, plan: conversion into steps,
+# import: job queue, parse, plan and writing of the steps (step controller or /step2 api).
+# plan and import report the generated steps per second in extra_info (steps_per_second).
+# Regressions are found by comparing with a saved run:
+#
+#   pytest tests/test_benchmark.py --benchmark-autosave
+#   pytest tests/test_benchmark.py --benchmark-compare --benchmark-compare-fail=median:20%
+import os
+
+import pytest
+
+from fakes import import_recipe, load_plugin, start_plugin, start_step_server
+from generators import make_beerxml, make_brewfather, make_kbh, make_mmum
+
+SOURCES = ("kbh", "xml", "json", "bf")
+# recipes per file (kbh, xml, bf) or hops and rests of the recipe (json)
+SIZES = (10, 100, 1000)
+MASH_STEPS = 4
+HOPS = 4
+
+
+def write_source(ext, root, source, size):
+    # creates the recipe source. Returns the id of a recipe in the middle of the file and the parser of the source
+    upload = os.path.join(root, "upload")
+    if source == "kbh":
+        path = os.path.join(upload, "kbh.db")
+        make_kbh(path, size, MASH_STEPS, HOPS)
+        kbh = load_plugin("kbh")
+        return size // 2 + 1, lambda Recipe_ID: kbh.parse(path, Recipe_ID)
+    if source == "xml":
+        path = os.path.join(upload, "beer.xml")
+        make_beerxml(path, size, MASH_STEPS, HOPS)
+        beerxml = load_plugin("beerxml")
+        return size // 2 + 1, lambda Recipe_ID: beerxml.parse(path, Recipe_ID)
+    if source == "json":
+        path = os.path.join(upload, "mmum.json")
+        make_mmum(path, size, size)
+        mmum = load_plugin("mmum")
+        return 1, lambda Recipe_ID: mmum.parse(path)
+    brewfather = load_plugin("brewfather")
+    for i in range(size):
+        Recipe_ID = "bf%d" % i
+        ext.bf_catalog.bodies[Recipe_ID] = make_brewfather(Recipe_ID, MASH_STEPS, HOPS)
+    return "bf%d" % (size // 2), lambda Recipe_ID: brewfather.loads(
+        ext.bf_catalog.get(Recipe_ID)
+    )
+
+
+def report_steps(benchmark, steps):
+    # steps of one run and steps per second (no timing with --benchmark-disable)
+    benchmark.extra_info["steps"] = steps
+    if benchmark.stats is not None:
+        benchmark.extra_info["steps_per_second"] = steps / benchmark.stats.stats.mean
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("source", SOURCES)
+def test_parse(benchmark, plugin, root, source, size):
+    cbpi, ext = plugin
+    Recipe_ID, parse = write_source(ext, root, source, size)
+    recipe = benchmark(parse, Recipe_ID)
+    assert recipe.mash_steps
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("source", SOURCES)
+def test_plan(benchmark, plugin, root, source, size):
+    cbpi, ext = plugin
+    Recipe_ID, parse = write_source(ext, root, source, size)
+    recipe = parse(Recipe_ID)
+    StepPlanBuilder = load_plugin("plan").StepPlanBuilder
+    config = ext.settings.get()
+    steps = benchmark(lambda: StepPlanBuilder(config).build(recipe))
+    assert steps
+    report_steps(benchmark, len(steps))
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("source", SOURCES)
+def test_import(benchmark, loop, plugin, root, source, size):
+    cbpi, ext = plugin
+    Recipe_ID, parse = write_source(ext, root, source, size)
+    result = benchmark(
+        lambda: loop.run_until_complete(import_recipe(ext, source, Recipe_ID))
+    )
+    assert result["steps"] > 0
+    assert not result["cached"]
+    report_steps(benchmark, result["steps"])
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_import_http(benchmark, loop, root, source):
+    # steps are posted one by one to a local stand-in of the /step2 api
+    runner, port, posted = loop.run_until_complete(start_step_server())
+    cbpi, ext = loop.run_until_complete(start_plugin(root, port))
+    try:
+        Recipe_ID, parse = write_source(ext, root, source, SIZES[0])
+        result = benchmark(
+            lambda: loop.run_until_complete(import_recipe(ext, source, Recipe_ID))
+        )
+        # every import posts all steps of the recipe
+        assert posted and len(posted) % result["steps"] == 0
+        report_steps(benchmark, result["steps"])
+    finally:
+        loop.run_until_complete(ext.shutdown())
+        loop.run_until_complete(runner.cleanup())
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# brewfather.Client against a local stand-in of the Brewfather api: download, cache with ttl,
+# ETag revalidation and the cached recipe as fallback if Brewfather can't be reached. Catalog refresh and list.
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from fakes import load_plugin
+from generators import make_brewfather
+
+brewfather = load_plugin("brewfather")
+
+
+# Brewfather api with one recipe per id. The ETag changes with the body, requests are recorded
+class BrewfatherServer:
+    def __init__(self):
+        self.recipes = {}
+        self.requests = []
+        self.runner = None
+        self.url = None
+
+    async def recipe(self, request):
+        self.requests.append(request.headers.copy())
+        body = self.recipes.get(request.match_info["id"])
+        if body is None:
+            raise web.HTTPNotFound()
+        etag = '"%x"' % hash(body)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body, content_type="application/json", headers={"ETag": etag}
+        )
+
+    async def summaries(self, request):
+        # all recipes fit on one page
+        return web.json_response(
+            [
+                {"_id": recipe_id, "name": json.loads(body)["name"], "_timestamp_ms": hash(body)}
+                for recipe_id, body in sorted(self.recipes.items())
+            ]
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v2/recipes", self.summaries)
+        app.router.add_get("/v2/recipes/{id}", self.recipe)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:%d/v2" % port
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+def server(loop):
+    server = BrewfatherServer()
+    server.recipes["bf1"] = make_brewfather("bf1")
+    loop.run_until_complete(server.start())
+    yield server
+    loop.run_until_complete(server.stop())
+
+
+async def _session():
+    # the session has to be created in the event loop of the test
+    return aiohttp.ClientSession()
+
+
+@pytest.fixture
+def client(loop, server, tmp_path):
+    session = loop.run_until_complete(_session())
+    yield brewfather.Client(
+        lambda: session, str(tmp_path / "brewfather"), "user", "key", 3600, server.url
+    )
+    loop.run_until_complete(session.close())
+
+
+def test_download(loop, server, client):
+    body = loop.run_until_complete(client.recipe("bf1"))
+    assert body == server.recipes["bf1"]
+    assert len(server.requests) == 1
+    assert server.requests[0]["Authorization"].startswith("Basic ")
+    assert "If-None-Match" not in server.requests[0]
+    meta, cached = client.read_cache("bf1")
+    assert cached == body
+    assert meta["etag"]
+
+
+def test_ttl(loop, server, client):
+    # within the ttl the cached recipe is returned without a request
+    first = loop.run_until_complete(client.recipe("bf1"))
+    assert loop.run_until_complete(client.recipe("bf1")) == first
+    assert len(server.requests) == 1
+
+
+def test_revalidation(loop, server, client):
+    first = loop.run_until_complete(client.recipe("bf1"))
+    meta, body = client.read_cache("bf1")
+    # unchanged: 304, the cached body is returned and the fetch time is renewed
+    assert loop.run_until_complete(client.recipe("bf1", force=True)) == first
+    assert server.requests[1]["If-None-Match"] == meta["etag"]
+    assert client.read_cache("bf1")[0]["fetched"] >= meta["fetched"]
+
+    # changed: the new body replaces the cached one
+    server.recipes["bf1"] = make_brewfather("bf1", 3, 2)
+    body = loop.run_until_complete(client.recipe("bf1", force=True))
+    assert body == server.recipes["bf1"]
+    assert client.read_cache("bf1")[1] == body
+    assert len(server.requests) == 3
+
+
+def test_expired(loop, server, client):
+    loop.run_until_complete(client.recipe("bf1"))
+    client.ttl = 0
+    loop.run_until_complete(client.recipe("bf1"))
+    assert len(server.requests) == 2
+    assert "If-None-Match" in server.requests[1]
+
+
+def test_offline(loop, server, client):
+    first = loop.run_until_complete(client.recipe("bf1"))
+    loop.run_until_complete(server.stop())
+    # cached recipe is used if Brewfather can't be reached
+    assert loop.run_until_complete(client.recipe("bf1", force=True)) == first
+    with pytest.raises(aiohttp.ClientError):
+        loop.run_until_complete(client.recipe("bf1", force=True, offline=False))
+    # nothing cached -> the error is raised
+    with pytest.raises(aiohttp.ClientError):
+        loop.run_until_complete(client.recipe("bf2"))
+
+
+def test_not_found(loop, server, client):
+    with pytest.raises(aiohttp.ClientResponseError):
+        loop.run_until_complete(client.recipe("bf2"))
+    assert client.read_cache("bf2") == (None, None)
+    with pytest.raises(ValueError):
+        loop.run_until_complete(client.recipe("../bf1"))
+
+
+def test_catalog(loop, server, client, tmp_path):
+    server.recipes["bf2"] = make_brewfather("bf2", 3, 2)
+    catalog = brewfather.Catalog(str(tmp_path / "brewfather"))
+    loop.run_until_complete(catalog.refresh(client))
+    assert catalog.get("bf2") == server.recipes["bf2"]
+    # the list is served from the summaries, not from the downloaded recipes
+    catalog.bodies.clear()
+    recipes, total = catalog.list(None, 1)
+    assert total == 2
+    assert [(r["id"], r["name"], r["boil_time"], r["steps"]) for r in recipes] == [
+        ("bf1", "BF Recipe bf1", 70, 4)
+    ]
+    recipes, total = catalog.list("bf1", 10)
+    assert [(r["id"], r["boil_time"], r["steps"]) for r in recipes] == [("bf2", 70, 3)]
+
+    # unchanged recipes are not downloaded again and keep boil time and steps
+    loop.run_until_complete(catalog.refresh(client))
+    requests = len(server.requests)
+    loop.run_until_complete(catalog.refresh(client))
+    assert len(server.requests) == requests
+    assert catalog.list(None, 10)[0][1]["steps"] == 3
+
+    # stored with the catalog
+    restored = brewfather.Catalog(str(tmp_path / "brewfather"))
+    restored.load()
+    assert restored.list(None, 10)[0] == catalog.list(None, 10)[0]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Generated steps compared with the output of the plugin before the common step plan builder (1.0.1).
+# golden/steps.json holds the steps that version 1.0.1 posted to /step2 for the synthetic recipes of generators.py,
+# key: <source>-<recipe id>-<config>. Differences on purpose (changelog 1.1.0) are applied by fixed_in_1_1():
+# - Brewfather without Lautering step: the last rest is no longer added twice
+# - MMuM: the original gravity notification is added once, after the boil
+# - MMuM in °F: MashIn and MashOut temps are converted from °C
+# Numbers are compared as numbers (1.0.1 posted some of them as strings) and mash steps without notification
+# got an empty one.
+import json
+import os
+
+import pytest
+
+from fakes import import_recipe, start_plugin, start_step_server
+from generators import make_beerxml, make_brewfather, make_kbh, make_mmum
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "steps.json")
+
+CONFIGS = {
+    "celsius": {},
+    "fahrenheit": {"TEMP_UNIT": "F"},
+    "lautering": {"steps_mashout": "NotificationStep", "AddMashInStep": "No"},
+}
+# bf2: fewer rests and a strike temp that has to be rounded
+BREWFATHER = {
+    "bf1": make_brewfather("bf1"),
+    "bf2": make_brewfather("bf2", 3, 2, strike_temp=71.8),
+}
+CASES = [
+    ("kbh", 1),
+    ("kbh", 2),
+    ("xml", 1),
+    ("xml", 2),
+    ("json", 1),
+    ("bf", "bf1"),
+    ("bf", "bf2"),
+]
+
+
+def normalize(step):
+    props = {}
+    for key, value in step["props"].items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            pass
+        props[key] = value
+    if step["type"] in ("MashStep", "MashInStep"):
+        props.setdefault("Notification", "")
+    return dict(step, props=props)
+
+
+def fahrenheit(temp):
+    return round(9.0 / 5.0 * temp + 32)
+
+
+def fixed_in_1_1(source, config_name, steps):
+    if source == "bf" and config_name != "lautering":
+        steps = [
+            step
+            for i, step in enumerate(steps)
+            if i == 0 or step != steps[i - 1] or step["type"] != "MashStep"
+        ]
+    if source == "json":
+        gravity = [
+            i for i, step in enumerate(steps) if step["name"] == "Measure Original Gravity"
+        ]
+        steps = [step for i, step in enumerate(steps) if i not in gravity[:-1]]
+        if config_name == "fahrenheit":
+            for step in steps:
+                if step["name"] in ("MashIn", "MashOut"):
+                    step["props"]["Temp"] = fahrenheit(step["props"]["Temp"])
+    return steps
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with open(GOLDEN) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("source,Recipe_ID", CASES)
+@pytest.mark.parametrize("config_name", sorted(CONFIGS))
+def test_steps(loop, root, golden, config_name, source, Recipe_ID):
+    upload = os.path.join(root, "upload")
+    make_kbh(os.path.join(upload, "kbh.db"), 2)
+    make_beerxml(os.path.join(upload, "beer.xml"), 2)
+    make_mmum(os.path.join(upload, "mmum.json"))
+    runner, port, posted = loop.run_until_complete(start_step_server())
+    cbpi, ext = loop.run_until_complete(
+        start_plugin(root, port, **CONFIGS[config_name])
+    )
+    try:
+        ext.bf_catalog.bodies.update(BREWFATHER)
+        result = loop.run_until_complete(import_recipe(ext, source, Recipe_ID))
+    finally:
+        loop.run_until_complete(ext.shutdown())
+        loop.run_until_complete(runner.cleanup())
+
+    expected = golden["%s-%s-%s" % (source, Recipe_ID, config_name)]
+    assert result["name"] == expected["name"]
+    steps = [normalize(step) for step in expected["steps"]]
+    assert [normalize(step) for step in posted] == fixed_in_1_1(
+        source, config_name, steps
+    )
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Catalog of the kbh database: only new or changed Sud entries (Gespeichert) are read again
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from fakes import load_plugin
+from generators import make_kbh
+
+kbh = load_plugin("kbh")
+
+
+@pytest.fixture
+def path(tmp_path):
+    kbh.close()
+    kbh.previous_entries = {}
+    path = str(tmp_path / "kbh.db")
+    make_kbh(path, 10)
+    yield path
+    kbh.close()
+    kbh.previous_entries = {}
+
+
+def execute(path, *statements):
+    # writes to the database with another connection, like kbh does
+    c = sqlite3.connect(path)
+    for statement in statements:
+        c.execute(*statement)
+    c.commit()
+    c.close()
+
+
+def change(path, sud_id, temp):
+    # new temp of the first rest and a new Gespeichert timestamp
+    execute(
+        path,
+        (
+            "UPDATE Sud SET Gespeichert = '2024-02-01 10:00:00' WHERE ID = ?",
+            (sud_id,),
+        ),
+        (
+            "UPDATE Maischplan SET TempRast = ? WHERE SudID = ? AND Typ = 1 AND Name = 'Rast 1'",
+            (temp, sud_id),
+        ),
+    )
+
+
+def syncs(database):
+    stats = database.stats()
+    del stats["recipes"]
+    return stats
+
+
+def test_incremental_sync(path):
+    database = kbh.get_database(path)
+    assert database.recipe_ids() == list(range(1, 11))
+    assert syncs(database) == {
+        "full": 1,
+        "incremental": 0,
+        "unchanged": 0,
+        "loaded": 10,
+        "removed": 0,
+    }
+    # nothing written: the catalog is not compared with the file
+    database.recipe_ids()
+    assert syncs(database)["unchanged"] == 0
+
+    change(path, 3, 64)
+    assert database.parse(3).mash_steps[1].temp == 64
+    assert database.parse(4).mash_steps[1].temp == 62
+    assert syncs(database) == {
+        "full": 1,
+        "incremental": 1,
+        "unchanged": 0,
+        "loaded": 11,
+        "removed": 0,
+    }
+
+    execute(path, ("DELETE FROM Sud WHERE ID = 5",))
+    assert 5 not in database.recipe_ids()
+    with pytest.raises(ValueError):
+        database.parse(5)
+    assert syncs(database)["incremental"] == 2
+    assert syncs(database)["loaded"] == 11
+    assert syncs(database)["removed"] == 1
+    assert database.stats()["recipes"] == 9
+
+
+def test_overwritten_in_place(path, tmp_path):
+    database = kbh.get_database(path)
+    database.recipe_ids()
+    other = str(tmp_path / "other.db")
+    make_kbh(other, 3)
+    change(other, 2, 66)
+    # same inode, new content
+    with open(other, "rb") as src, open(path, "r+b") as dst:
+        dst.truncate(0)
+        shutil.copyfileobj(src, dst)
+    assert database.recipe_ids() == [1, 2, 3]
+    assert database.parse(2).mash_steps[1].temp == 66
+    assert syncs(database) == {
+        "full": 1,
+        "incremental": 1,
+        "unchanged": 0,
+        "loaded": 11,
+        "removed": 7,
+    }
+
+
+def test_new_upload_reads_changed_entries(path, tmp_path):
+    kbh.get_database(path).recipe_ids()
+    # the upload of a new kbh.db is stored under a new path, the old database is closed
+    kbh.close(path)
+    upload = str(tmp_path / "upload.db")
+    shutil.copy(path, upload)
+    change(upload, 7, 63)
+    database = kbh.get_database(upload)
+    assert database.parse(7).mash_steps[1].temp == 63
+    assert database.parse(1).name == "Sud 1"
+    assert syncs(database) == {
+        "full": 0,
+        "incremental": 1,
+        "unchanged": 0,
+        "loaded": 1,
+        "removed": 0,
+    }
+
+
+def test_missing_file(tmp_path):
+    missing = str(tmp_path / "missing.db")
+    with pytest.raises(FileNotFoundError):
+        kbh.list_recipes(missing, None, 10)
+    assert os.path.abspath(missing) not in kbh.stats()
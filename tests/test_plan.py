@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Boil steps of the StepPlanBuilder: alerts per boil step (recipe_import_boil_alerts), chained boil steps,
+# additions at the same time and additions before the start of the boil
+import pytest
+
+from fakes import load_plugin, start_plugin
+
+recipe = load_plugin("recipe")
+
+
+@pytest.fixture
+def builder(loop, root):
+    # creates a StepPlanBuilder with the settings of a plugin (boil_alerts: recipe_import_boil_alerts)
+    def create(boil_alerts=6):
+        cbpi, ext = loop.run_until_complete(
+            start_plugin(root, recipe_import_boil_alerts=boil_alerts)
+        )
+        config = ext.settings.get()
+        loop.run_until_complete(ext.shutdown())
+        return load_plugin("plan").StepPlanBuilder(config)
+
+    return create
+
+
+def make_recipe(boil_time, hops, miscs=()):
+    result = recipe.Recipe("Boil", float(boil_time))
+    result.hops = [recipe.Addition(name, time) for name, time in hops]
+    result.miscs = [recipe.Addition(name, time) for name, time in miscs]
+    return result
+
+
+def boil(steps):
+    # (name, Timer, [(Hop_N, Hop_N_text), ...]) of the boil steps, empty slots are left out
+    result = []
+    for step in steps:
+        if step["type"] != "BoilStep":
+            continue
+        props = step["props"]
+        alerts = []
+        slot = 1
+        while "Hop_%d" % slot in props:
+            if props["Hop_%d" % slot] is not None:
+                alerts.append((props["Hop_%d" % slot], props["Hop_%d_text" % slot]))
+            slot += 1
+        result.append((step["name"], props["Timer"], alerts))
+    return result
+
+
+def test_one_boil_step(builder):
+    steps = builder().boil_steps(
+        make_recipe(70, [("Magnum", 70), ("Perle", 40), ("Saaz", 10)], [("Irish Moss", 10)])
+    )
+    assert boil(steps) == [
+        (
+            "Boil Step",
+            "70",
+            [(70.0, "Magnum"), (40.0, "Perle"), (10.0, "Saaz and Irish Moss")],
+        )
+    ]
+    # the standard BoilStep has 6 alerts, unused ones are empty
+    assert steps[0]["props"]["Hop_6"] is None
+
+
+def test_chained_boil_steps(builder):
+    hops = [("Hop %d" % time, time) for time in (60, 55, 45, 40, 30, 20, 10, 5)]
+    steps = builder().boil_steps(make_recipe(60, hops))
+    # each step ends with the first alert of the next step, alerts are relative to the end of their step
+    assert boil(steps) == [
+        (
+            "Boil Step",
+            "50",
+            [
+                (50.0, "Hop 60"),
+                (45.0, "Hop 55"),
+                (35.0, "Hop 45"),
+                (30.0, "Hop 40"),
+                (20.0, "Hop 30"),
+                (10.0, "Hop 20"),
+            ],
+        ),
+        ("Boil Step 2", "10", [(10.0, "Hop 10"), (5.0, "Hop 5")]),
+    ]
+    assert [step["props"]["LidAlert"] for step in steps] == ["Yes", "No"]
+
+
+def test_boil_alerts_setting(builder):
+    hops = [("Magnum", 90), ("Perle", 70), ("Tettnanger", 60), ("Saaz", 30), ("Citra", 10)]
+    steps = builder(2).boil_steps(make_recipe(60, hops))
+    # 90 and 70 min additions are due at the start of a 60 min boil
+    assert boil(steps) == [
+        (
+            "Boil Step",
+            "50",
+            [(50.0, "Magnum and Perle and Tettnanger"), (20.0, "Saaz")],
+        ),
+        ("Boil Step 2", "10", [(10.0, "Citra")]),
+    ]
+    assert all(int(step["props"]["Timer"]) > 0 for step in steps)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# GET /creation/search: limit is bounded to 1..500
+import json
+import os
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from generators import make_kbh
+
+
+def search(loop, ext, query):
+    response = loop.run_until_complete(
+        ext.search_recipes(make_mocked_request("GET", "/creation/search?" + query))
+    )
+    return response.status, json.loads(response.body)
+
+
+@pytest.mark.parametrize(
+    "limit,results",
+    [
+        ("", 20),
+        ("&limit=-1", 1),
+        ("&limit=0", 1),
+        ("&limit=50", 50),
+        ("&limit=100000", 500),
+    ],
+)
+def test_limit(loop, plugin, root, limit, results):
+    cbpi, ext = plugin
+    make_kbh(os.path.join(root, "upload", "kbh.db"), 600)
+    status, body = search(loop, ext, "q=Sud&source=kbh" + limit)
+    assert status == 200
+    assert body["total"] == 600
+    assert len(body["results"]) == results
+
+
+def test_invalid_limit(loop, plugin):
+    cbpi, ext = plugin
+    status, body = search(loop, ext, "q=Sud&limit=many")
+    assert status == 400
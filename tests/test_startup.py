@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Startup of the plugin: import time budget, modules that must only be imported on first use, settings snapshot
+import os
+import subprocess
+import sys
+
+from fakes import PACKAGE
+
+# modules that are loaded by cbpi before the plugin -> not part of the startup time of the plugin
+PRELOADED = (
+    "aiohttp.web",
+    "cbpi.api",
+    "cbpi.api.config",
+    "cbpi.api.dataclasses",
+    "shortuuid",
+)
+# budget on a desktop pc (startup from compiled .pyc files). A Raspberry Pi 4 needs roughly 10x the time
+STARTUP_BUDGET_MS = 10
+# must not be imported at startup
+LAZY = ("sqlite3", "xml.etree.ElementTree", "cProfile", "tracemalloc", "unittest")
+
+
+def startup_time(runs=5):
+    # import time (ms) of the plugin in a new interpreter, best of runs. The modules imported by the plugin are taken from python -X importtime
+    code = (
+        "import importlib, sys, time, %s\n"
+        "sys.stderr.write('plugin\\n')\n"
+        "start = time.perf_counter()\n"
+        "importlib.import_module(%r)\n"
+        "print(time.perf_counter() - start)" % (", ".join(PRELOADED), PACKAGE)
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    best = None
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        total = float(process.stdout) * 1000
+        # "import time: self [us] | cumulative | name", only the imports after the preload
+        lines = process.stderr.split("plugin\n", 1)[1].splitlines()
+        modules = []
+        for line in lines:
+            if line.startswith("import time:") and "|" in line:
+                own, cumulative, name = line[len("import time:") :].split("|")
+                if own.strip().isdigit():
+                    modules.append((name.strip(), int(own) / 1000))
+        if best is None or total < best[0]:
+            best = (total, modules)
+    total, modules = best
+    return {
+        "import_ms": round(total, 3),
+        "budget_ms": STARTUP_BUDGET_MS,
+        "modules": [
+            (name, round(ms, 3))
+            for name, ms in sorted(modules, key=lambda m: m[1], reverse=True)[:10]
+        ],
+        "eager": [name for name in LAZY if name in {m[0] for m in modules}],
+    }
+
+
+def test_startup_time():
+    result = startup_time()
+    assert not result["eager"], "loaded at startup: %s" % ", ".join(result["eager"])
+    assert result["import_ms"] <= result["budget_ms"], result["modules"]
+
+
+def test_settings_snapshot(loop, plugin):
+    cbpi, ext = plugin
+    snapshot = ext.settings.value
+    # built at startup and used by the imports until the config or the kettles change
+    assert snapshot is not None and snapshot["kettle_id"] == "kettle"
+    assert ext.settings.get() is snapshot
+    loop.run_until_complete(cbpi.config.set("AutoMode", "No"))
+    assert ext.settings.value is None
+    assert ext.settings.get()["AutoMode"] == "No"
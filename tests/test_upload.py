@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# POST /creation/upload: files are stored by hash, a replaced upload is deleted with its index
+import os
+
+import aiohttp
+from aiohttp import web
+
+from fakes import load_plugin
+from generators import make_beerxml
+
+
+async def upload(ext, *files):
+    # posts (file name, content) as multipart to the upload handler of the plugin
+    app = web.Application()
+    app.router.add_post("/upload", ext.upload_file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            for name, content in files:
+                data = aiohttp.FormData()
+                data.add_field("file", content, filename=name)
+                async with session.post(
+                    "http://127.0.0.1:%d/upload" % port, data=data
+                ) as r:
+                    assert r.status == 200
+    finally:
+        await runner.cleanup()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def count_recipes(ext):
+    # lists the active BeerXML file (writes its index)
+    path = await ext.source_path("xml")
+    recipes, total = await ext.parse(load_plugin("beerxml").list_recipes, path, None, 10)
+    return total
+
+
+def stored_files(ext):
+    return sorted(
+        name for name in os.listdir(ext.uploads.root) if name != "manifest.json"
+    )
+
+
+def test_replaced_upload_is_deleted(loop, plugin, root):
+    cbpi, ext = plugin
+    make_beerxml(os.path.join(root, "a.xml"), 2)
+    make_beerxml(os.path.join(root, "b.xml"), 3)
+    first, second = read(os.path.join(root, "a.xml")), read(os.path.join(root, "b.xml"))
+
+    loop.run_until_complete(upload(ext, ("beer.xml", first)))
+    first_hash = ext.uploads.active("xml")["hash"]
+    # the BeerXML index is written next to the stored file
+    assert loop.run_until_complete(count_recipes(ext)) == 2
+    assert stored_files(ext) == [first_hash + ".xml", first_hash + ".xml.index.json"]
+
+    # same name, new content: the first file and its index are deleted
+    loop.run_until_complete(upload(ext, ("beer.xml", second)))
+    second_hash = ext.uploads.active("xml")["hash"]
+    assert stored_files(ext) == [second_hash + ".xml"]
+    assert loop.run_until_complete(count_recipes(ext)) == 3
+
+    # other name: the replaced file leaves the manifest
+    loop.run_until_complete(upload(ext, ("other.xml", first)))
+    assert list(ext.uploads.manifest["files"]) == ["other.xml"]
+    assert stored_files(ext) == [first_hash + ".xml"]
+
+
+def test_identical_upload_is_kept(loop, plugin, root):
+    cbpi, ext = plugin
+    make_beerxml(os.path.join(root, "a.xml"), 2)
+    content = read(os.path.join(root, "a.xml"))
+    loop.run_until_complete(upload(ext, ("beer.xml", content), ("copy.xml", content)))
+    digest = ext.uploads.active("xml")["hash"]
+    assert ext.uploads.manifest["files"]["copy.xml"]["stored"]
+    assert stored_files(ext) == [digest + ".xml"]